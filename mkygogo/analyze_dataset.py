@@ -1,6 +1,14 @@
 import os
 import json
-import pandas as pd
+try:
+    import orjson
+except ImportError:
+    # 锁定环境里没有 orjson 时退回标准库，慢一点但照样能出报告
+    class orjson:
+        loads = staticmethod(json.loads)
+import pyarrow as pa
+import pyarrow.json as paj
+import pyarrow.parquet as pq
 from pathlib import Path
 
 # === 配置 ===
@@ -28,9 +36,9 @@ def analyze_dataset(dataset_path, output_file):
         if info_path.exists():
             log(f"--- [1] Content of meta/info.json ---")
             try:
-                with open(info_path, 'r', encoding='utf-8') as jf:
-                    data = json.load(jf)
-                    log(json.dumps(data, indent=2, ensure_ascii=False))
+                # orjson 直接吃 bytes，省掉文本解码 + 慢解析
+                data = orjson.loads(info_path.read_bytes())
+                log(json.dumps(data, indent=2, ensure_ascii=False))
             except Exception as e:
                 log(f"Error reading info.json: {e}")
         else:
@@ -43,10 +51,10 @@ def analyze_dataset(dataset_path, output_file):
         if tasks_path.exists():
             log(f"--- [2] Sample tasks from meta/tasks.jsonl (First 2) ---")
             try:
-                with open(tasks_path, 'r', encoding='utf-8') as jf:
-                    for i, line in enumerate(jf):
-                        if i >= 2: break
-                        log(f"Task {i}: {line.strip()}")
+                # Arrow 的 JSON reader 在 C 层多线程分块解析，任务多也不怕
+                tbl = paj.read_json(str(tasks_path), read_options=paj.ReadOptions(block_size=1 << 20))
+                for i, task in enumerate(tbl.slice(0, 2).to_pylist()):
+                    log(f"Task {i}: {task}")
             except Exception as e:
                 log(f"Error reading tasks.jsonl: {e}")
         else:
@@ -59,22 +67,21 @@ def analyze_dataset(dataset_path, output_file):
         if stats_path.exists():
             log(f"--- [3] Structure of meta/stats.json ---")
             try:
-                with open(stats_path, 'r', encoding='utf-8') as jf:
-                    data = json.load(jf)
-                    # 只打印键名和简单的类型/长度，避免打印海量数组
-                    for key, value in data.items():
-                        if isinstance(value, dict):
-                            log(f"Key: '{key}'")
-                            for sub_k, sub_v in value.items():
-                                if isinstance(sub_v, list):
-                                    log(f"  - {sub_k}: List (len={len(sub_v)})")
-                                    # 打印前3个数值作为示例，判断归一化范围
-                                    if len(sub_v) > 0 and isinstance(sub_v[0], (int, float)):
-                                        log(f"    Sample: {sub_v[:3]}...")
-                                else:
-                                    log(f"  - {sub_k}: {sub_v}")
-                        else:
-                            log(f"Key: '{key}' -> {type(value)}")
+                data = orjson.loads(stats_path.read_bytes())
+                # 只打印键名和简单的类型/长度，避免打印海量数组
+                for key, value in data.items():
+                    if isinstance(value, dict):
+                        log(f"Key: '{key}'")
+                        for sub_k, sub_v in value.items():
+                            if isinstance(sub_v, list):
+                                log(f"  - {sub_k}: List (len={len(sub_v)})")
+                                # 打印前3个数值作为示例，判断归一化范围
+                                if len(sub_v) > 0 and isinstance(sub_v[0], (int, float)):
+                                    log(f"    Sample: {sub_v[:3]}...")
+                            else:
+                                log(f"  - {sub_k}: {sub_v}")
+                    else:
+                        log(f"Key: '{key}' -> {type(value)}")
             except Exception as e:
                 log(f"Error reading stats.json: {e}")
         log("\n")
@@ -88,13 +95,20 @@ def analyze_dataset(dataset_path, output_file):
                 sample_file = parquet_files[0]
                 log(f"--- [4] Analyzing Sample Episode: {sample_file.name} ---")
                 try:
-                    df = pd.read_parquet(sample_file)
-                    log(f"DataFrame Shape (Rows, Cols): {df.shape}")
-                    log(f"Columns List: {list(df.columns)}")
-                    
+                    # 只读 footer 元数据拿形状/列名，不解码任何数据列
+                    pf = pq.ParquetFile(sample_file)
+                    schema = pf.schema_arrow
+                    log(f"DataFrame Shape (Rows, Cols): ({pf.metadata.num_rows}, {len(schema.names)})")
+                    log(f"Columns List: {schema.names}")
+
                     log("\n--- First Row Data Sample ---")
-                    # 转为dict方便查看
-                    first_row = df.iloc[0].to_dict()
+                    # 列裁剪：跳过图像等大二进制列，避免为了看第一行解码几百MB
+                    sample_cols = [
+                        field.name for field in schema
+                        if not (pa.types.is_binary(field.type) or pa.types.is_large_binary(field.type))
+                    ]
+                    tbl = pf.read_row_group(0, columns=sample_cols)
+                    first_row = {name: tbl.column(name)[0].as_py() for name in tbl.column_names}
                     for k, v in first_row.items():
                         # 如果是图像或大数组，只打印类型和形状
                         val_str = str(v)
@@ -104,8 +118,11 @@ def analyze_dataset(dataset_path, output_file):
                             val_str = f"List len={len(v)} (Sample: {v[:5]}...)"
                         elif isinstance(v, bytes):
                             val_str = f"Bytes (len={len(v)})"
-                        
+
                         log(f"  {k}: {val_str}")
+                    skipped = [n for n in schema.names if n not in sample_cols]
+                    if skipped:
+                        log(f"  (Skipped binary columns: {skipped})")
                 except Exception as e:
                     log(f"Error reading parquet file: {e}")
             else:
@@ -1,27 +1,66 @@
-import pandas as pd
+import functools
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 import numpy as np
 import os
 
+
+@functools.lru_cache(maxsize=64)
+def _open_parquet(path: str) -> pq.ParquetFile:
+    """
+    进程级缓存 ParquetFile 句柄：批量回放多个 Episode 时
+    footer/metadata 只解析一次，pre_buffer 合并列块读取
+    memory_map=True 让文件按页惰性换入，扫描大数据集不会整文件进 RAM
+    """
+    return pq.ParquetFile(path, memory_map=True, pre_buffer=True)
+
+
 class EpisodeActionLoader:
     def __init__(self, dataset_root, episode_id, chunk_id=0):
         """
         加载指定 Episode 的 Action 数据
         """
         self.parquet_path = os.path.join(
-            dataset_root, 
-            "data", 
-            f"chunk-{chunk_id:03d}", 
+            dataset_root,
+            "data",
+            f"chunk-{chunk_id:03d}",
             f"episode_{episode_id:06d}.parquet"
         )
-        
+
         if not os.path.exists(self.parquet_path):
             raise FileNotFoundError(f"Dataset file not found: {self.parquet_path}")
-            
+
         print(f"[Loader] Loading actions from: {self.parquet_path}")
-        self.df = pd.read_parquet(self.parquet_path)
-        self.total_frames = len(self.df)
+        # 只读需要的两列，一次性转成连续的 (N, D) float32 矩阵
+        # 之后 get_action 只做行索引（视图），不再逐帧拷贝
+        pf = _open_parquet(self.parquet_path)
+        table = pf.read(columns=["action", "observation.state"], use_threads=True)
+        self.actions = self._column_to_matrix(table.column("action"))
+        self.states = self._column_to_matrix(table.column("observation.state"))
+        # 加载时校验一次，get_action 热路径就不用再做 isinstance/dtype 分支
+        assert self.actions.dtype == np.float32 and self.actions.flags.c_contiguous
+        assert self.states.dtype == np.float32 and self.states.flags.c_contiguous
+        self.total_frames = pf.metadata.num_rows
         self.current_idx = 0
 
+    @staticmethod
+    def _column_to_matrix(column) -> np.ndarray:
+        """
+        把 Arrow 列转成 (N, D) float32 矩阵
+        FixedSizeList 列可以直接对底层 buffer 做零拷贝 reshape
+        """
+        arr = column.combine_chunks()
+        if pa.types.is_fixed_size_list(arr.type):
+            width = arr.type.list_size
+            flat = arr.values.to_numpy(zero_copy_only=True)
+            matrix = flat.reshape(-1, width).astype(np.float32, copy=False)
+        else:
+            # 变长 list 等情况：退化为一次性 stack
+            matrix = np.stack(arr.to_pylist()).astype(np.float32, copy=False)
+        # 保证行连续 (SoA)，热循环里的行索引就是纯指针运算
+        return np.ascontiguousarray(matrix)
+
     def __len__(self):
         return self.total_frames
 
@@ -31,24 +70,28 @@ class EpisodeActionLoader:
         """
         if self.current_idx >= self.total_frames:
             return None
-        
-        # 获取当前行的 action
-        action = self.df.iloc[self.current_idx]['action']
-        
-        # 确保转为 numpy 数组 (float32)
-        if not isinstance(action, np.ndarray):
-            action = np.array(action, dtype=np.float32)
-            
+
+        # 直接返回矩阵的行视图 (float32)，无拷贝
+        action = self.actions[self.current_idx]
         self.current_idx += 1
         return action
 
+    def get_actions(self, n: int) -> np.ndarray:
+        """
+        批量取接下来 n 帧 Action，返回连续的 (m, D) 视图 (m <= n)
+        播放完时返回空数组；调用方本地迭代行，摊薄每帧的调用开销
+        """
+        end = min(self.current_idx + n, self.total_frames)
+        out = self.actions[self.current_idx:end]
+        self.current_idx = end
+        return out
+
     def get_start_state(self):
         """
         获取该 Episode 第一帧的机械臂状态 (observation.state)
         用于在开始回放前，先把机械臂移动到初始位置，防止瞬移
         """
-        state = self.df.iloc[0]['observation.state']
-        return np.array(state, dtype=np.float32)
-        
+        return self.states[0]
+
     def reset(self):
-        self.current_idx = 0
\ No newline at end of file
+        self.current_idx = 0
@@ -1,5 +1,8 @@
 import numpy as np
 import logging
+import os
+import queue
+import threading
 import cv2
 from typing import Dict, Any
 from openpi_client.runtime import environment
@@ -11,6 +14,37 @@ from mkygogo.mkrobot.mk_controller import MKController
 
 logger = logging.getLogger(__name__)
 
+# 插值缓冲上限 (一次 Chunk 切换的插值步数不会超过这个)
+MAX_INTERP_STEPS = 64
+
+# 可选: 有 numba 就把插值内核编译成机器码 (没有则走向量化 NumPy)
+try:
+    import numba
+
+    @numba.njit(cache=True, fastmath=True)
+    def _build_traj_jit(start, delta, steps, out):  # pragma: no cover - 编译内核
+        inv = 1.0 / (steps + 1)
+        for j in range(steps):
+            a = (j + 1) * inv
+            for k in range(6):
+                out[j, k] = start[k] + delta[k] * a
+            out[j, 6] = start[6]
+
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# 按类型一次分发，省掉热路径上的 isinstance/hasattr 判断
+# float32 ndarray 直接透传；其他类型 (list / torch.Tensor 等) 走转换
+_ACTION_ADAPTERS = {
+    np.ndarray: lambda x: np.asarray(x, dtype=np.float32),
+}
+try:
+    import torch
+    _ACTION_ADAPTERS[torch.Tensor] = lambda x: x.detach().cpu().numpy().astype(np.float32, copy=False)
+except ImportError:
+    pass
+
 class MKRobotOpenPIEnv(environment.Environment):
     def __init__(self, prompt: str, port: str = "/dev/ttyACM0"):
         self.prompt = prompt
@@ -25,6 +59,30 @@ class MKRobotOpenPIEnv(environment.Environment):
         self.step_count = 0
         # 记录上一次执行的动作，用于插值计算
         self.prev_action = None
+        # Debug 窗口默认关闭 (MKROBOT_DEBUG_VIEW=1 打开)
+        # 30Hz 推理循环里 cvtColor/imshow/waitKey 每步要吃掉几毫秒
+        self._debug_view = bool(int(os.environ.get("MKROBOT_DEBUG_VIEW", "0")))
+        # 预分配显示缓冲，cvtColor 直接写 dst，不每帧新建数组
+        self._show_base = np.empty((448, 448, 3), dtype=np.uint8)
+        self._show_wrist = np.empty((448, 448, 3), dtype=np.uint8)
+        # 插值轨迹复用同一块 float32 缓冲，Chunk 切换时零分配
+        self._interp_buf = np.empty((MAX_INTERP_STEPS, 7), dtype=np.float32)
+        # 缺帧/缺状态时的兜底零数组：只建一次，标只读防止被改
+        self._zero_top = np.zeros((480, 640, 3), dtype=np.uint8)
+        self._zero_wrist = np.zeros((360, 640, 3), dtype=np.uint8)
+        self._zero_out = np.zeros((448, 448, 3), dtype=np.uint8)
+        self._zero_state = np.zeros(7, dtype=np.float32)
+        for arr in (self._zero_top, self._zero_wrist, self._zero_out, self._zero_state):
+            arr.flags.writeable = False
+        # 每路相机各一块常驻 resize 输出缓冲 (单缓冲: 下一帧覆盖上一帧)
+        self._resize_dst = {
+            "top": np.empty((448, 448, 3), dtype=np.uint8),
+            "wrist": np.empty((448, 448, 3), dtype=np.uint8),
+        }
+        # Debug 渲染放到后台线程：1 槽队列 + 丢旧策略，控制循环永不阻塞
+        self._view_q: queue.Queue = queue.Queue(maxsize=1)
+        if self._debug_view:
+            threading.Thread(target=self._viewer_loop, daemon=True).start()
 
     @property
     def action_space(self):
@@ -43,25 +101,56 @@ class MKRobotOpenPIEnv(environment.Environment):
             })
         })
 
-    def _process_image(self, img_np, target_size=448):
+    def _process_image(self, img_np, target_size=448, dst=None):
         """
         复刻训练时的图像处理逻辑：中心裁剪 + 缩放
+        dst 传预分配输出缓冲可避免每帧 ~600KB 的 resize 分配
+        (调用方注意: 复用 dst 意味着上一帧的数组会被覆盖)
         """
         if img_np is None:
-            return np.zeros((target_size, target_size, 3), dtype=np.uint8)
+            return self._zero_out
 
         h, w = img_np.shape[:2]
         min_dim = min(h, w)
-        
-        # 1. 中心裁剪 (Center Crop)
+
+        # 中心裁剪 (Center Crop) + 缩放 (Resize) 一次完成：
+        # 切片是视图 (无拷贝)，OpenCV 直接按 stride 读 ROI，单趟出结果
         start_h = (h - min_dim) // 2
         start_w = (w - min_dim) // 2
-        img_cropped = img_np[start_h:start_h + min_dim, start_w:start_w + min_dim]
-        
-        # 2. 缩放 (Resize)
-        img_resized = cv2.resize(img_cropped, (target_size, target_size), interpolation=cv2.INTER_AREA)
-        
-        return img_resized
+        roi = img_np[start_h:start_h + min_dim, start_w:start_w + min_dim]
+        if min_dim == target_size:
+            # 裁完尺寸正好，连 resize 都省掉
+            if dst is not None:
+                np.copyto(dst, roi)
+                return dst
+            return np.ascontiguousarray(roi)
+        # 接近 1:1 的缩放 (480->448) 用 INTER_LINEAR 的 SIMD 快路径；
+        # 只有大幅下采样 (>2x) 才值得 INTER_AREA 的面积加权
+        interp = cv2.INTER_AREA if target_size * 2 < min_dim else cv2.INTER_LINEAR
+        if dst is not None:
+            cv2.resize(roi, (target_size, target_size), dst=dst, interpolation=interp)
+            return dst
+        return cv2.resize(roi, (target_size, target_size), interpolation=interp)
+
+    def _viewer_loop(self) -> None:
+        """
+        [后台线程] 消费最新帧并渲染 Debug 窗口
+        GUI 刷新再慢也拖不住 30Hz 控制循环
+        """
+        while True:
+            try:
+                img_base, img_wrist, step = self._view_q.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                cv2.cvtColor(img_base, cv2.COLOR_RGB2BGR, dst=self._show_base)
+                cv2.cvtColor(img_wrist, cv2.COLOR_RGB2BGR, dst=self._show_wrist)
+                cv2.putText(self._show_base, f"Step: {step}", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.imshow("Debug View: TOP", self._show_base)
+                cv2.imshow("Debug View: WRIST", self._show_wrist)
+                cv2.waitKey(1)
+            except Exception: pass
 
     def reset(self) -> None:
         logger.info("Resetting environment...")
@@ -92,31 +181,40 @@ class MKRobotOpenPIEnv(environment.Environment):
         
         state = raw_obs.get("state")
         
-        if state is None: 
-            state = np.zeros(7, dtype=np.float32)
-        
+        if state is None:
+            state = self._zero_state
+
         # 可选：加个安全截断，防止万一 driver 抽风发多了
         if state.shape[0] > 7:
             state = state[:7]
-        
-        # 图像容错
-        if raw_img_base is None: raw_img_base = np.zeros((480, 640, 3), dtype=np.uint8)
-        if raw_img_wrist is None: raw_img_wrist = np.zeros((360, 640, 3), dtype=np.uint8)
 
-        img_base_processed = self._process_image(raw_img_base, target_size=448)
-        img_wrist_processed = self._process_image(raw_img_wrist, target_size=448)
+        # 图像容错 (复用预分配的零图，不每次 np.zeros)
+        if raw_img_base is None: raw_img_base = self._zero_top
+        if raw_img_wrist is None: raw_img_wrist = self._zero_wrist
+
+        # 复用 dst 缓冲前先解冻 (上一帧把它标成了只读)
+        for dst in self._resize_dst.values():
+            dst.flags.writeable = True
+        img_base_processed = self._process_image(raw_img_base, target_size=448, dst=self._resize_dst["top"])
+        img_wrist_processed = self._process_image(raw_img_wrist, target_size=448, dst=self._resize_dst["wrist"])
+        # left/right wrist 故意共享同一块 buffer (见下方 return)，
+        # 标成只读防止下游误写；消费方只读时不会触发拷贝
+        img_base_processed.flags.writeable = False
+        img_wrist_processed.flags.writeable = False
         
-        # DEBUG View 
-        try:
-            self.step_count += 1
-            show_base = cv2.cvtColor(img_base_processed, cv2.COLOR_RGB2BGR)
-            show_wrist = cv2.cvtColor(img_wrist_processed, cv2.COLOR_RGB2BGR)
-            cv2.putText(show_base, f"Step: {self.step_count}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.imshow("Debug View: TOP", show_base)
-            cv2.imshow("Debug View: WRIST", show_wrist)
-            cv2.waitKey(1)
-        except Exception: pass
+        self.step_count += 1
+
+        # DEBUG View (默认关闭，MKROBOT_DEBUG_VIEW=1 打开)
+        # 只把最新帧塞进 1 槽队列，渲染在后台线程做，塞不进就丢旧换新
+        if self._debug_view:
+            try:
+                self._view_q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._view_q.put_nowait((img_base_processed, img_wrist_processed, self.step_count))
+            except queue.Full:
+                pass
 
         self.current_state = {"state": state}
         
@@ -173,43 +271,45 @@ class MKRobotOpenPIEnv(environment.Environment):
         """
         if steps <= 0: return
 
-        start_arm = start_pose[:6]
-        start_gripper = start_pose[6:]
-        target_arm = target_pose[:6]
-
-        for j in range(1, steps + 1):
-            # ⏱️ [优化] 记录循环开始时间
-            loop_start = time.time()
-            
-            alpha = j / (steps + 1)
-            
-            # 机械臂插值
-            interp_arm = start_arm + (target_arm - start_arm) * alpha
-            # 夹爪保持
-            interp_gripper = start_gripper 
-            
-            interp_cmd = np.concatenate([interp_arm, interp_gripper])
-            
-            self.controller.apply_action(interp_cmd)
-            
-            # ⏱️ [优化] 扣除通讯耗时，精确休眠
-            elapsed = time.time() - loop_start
-            sleep_time = dt - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        # 🚀 [优化] 一次性算好整条插值轨迹 (steps, 7)，循环里只剩行索引 + 发送
+        # 机械臂 (0-5): 线性插值；夹爪 (6): 保持 Start 状态 (不插值)
+        # 全程 float32 + out= 写入预分配缓冲，无临时数组
+        start = np.asarray(start_pose, dtype=np.float32)
+        delta = np.asarray(target_pose, dtype=np.float32) - start
+        if steps <= MAX_INTERP_STEPS:
+            traj = self._interp_buf[:steps]
+        else:
+            traj = np.empty((steps, 7), dtype=np.float32)
+        if _HAVE_NUMBA:
+            _build_traj_jit(start, delta, steps, traj)
+        else:
+            alphas = np.arange(1, steps + 1, dtype=np.float32) / np.float32(steps + 1)
+            np.multiply(delta[None, :], alphas[:, None], out=traj)
+            traj += start
+            traj[:, 6] = start[6]
+
+        # ⏱️ [优化] 绝对 deadline 控频：每步 deadline += dt，不随 sleep 误差漂移
+        deadline = time.perf_counter()
+        for j in range(steps):
+            self.controller.apply_action(traj[j])
+
+            deadline += dt
+            now = time.perf_counter()
+            if deadline > now:
+                time.sleep(deadline - now)
 
     def apply_action(self, action: Dict[str, Any]) -> None:
         raw_action = action.get("actions")
         if raw_action is None: return
 
-        if not isinstance(raw_action, np.ndarray):
-            raw_action = np.array(raw_action, dtype=np.float32)
+        # 按类型查表转换 (ndarray 零拷贝透传)，再用一次 reshape 统一成 (N, 7)
+        # (7,) -> (1, 7)；(1, 30, 7) -> (30, 7)
+        raw_action = _ACTION_ADAPTERS.get(type(raw_action), lambda x: np.asarray(x, dtype=np.float32))(raw_action)
+        raw_action = raw_action.reshape(-1, raw_action.shape[-1])
+
+        # 入口处保证一次连续，循环里 raw_action[i] 都是零拷贝行视图
+        raw_action = np.ascontiguousarray(raw_action)
 
-        if raw_action.ndim == 1:
-            raw_action = raw_action.reshape(1, -1)
-        if raw_action.ndim == 3:
-            raw_action = raw_action[0]
-            
         chunk_len = raw_action.shape[0]
         control_hz = 30.0
         dt = 1.0 / control_hz
@@ -232,7 +332,8 @@ class MKRobotOpenPIEnv(environment.Environment):
         # 🚀 阶段 1: 处理 Chunk 间的缝隙 (插值)
         # ==========================================
         if should_interpolate:
-            print(f"🌊 [Env] 检测到 Chunk 切换，正在执行平滑插值...")
+            # 懒格式化: level 不够时连字符串都不拼
+            logger.info("🌊 [Env] 检测到 Chunk 切换，正在执行平滑插值 (%d 步)...", INTERP_STEPS)
             self._run_interpolation(
                 start_pose=self.prev_action, 
                 target_pose=raw_action[0], 
@@ -243,20 +344,20 @@ class MKRobotOpenPIEnv(environment.Environment):
         # ==========================================
         # 🚀 阶段 2: 原样执行 (全速运行！)
         # ==========================================
+        # ⏱️ [优化] 绝对 deadline 控频，长 Chunk 也不会累积漂移
+        deadline = time.perf_counter()
         for i in range(chunk_len):
-            loop_start = time.time()
-            
             final_cmd = raw_action[i]
-            
-            self.controller.apply_action(final_cmd)   
-            
+
+            self.controller.apply_action(final_cmd)
+
             self.prev_action = final_cmd
-            
+
             if chunk_len > 1:
-                elapsed = time.time() - loop_start
-                sleep_time = dt - elapsed
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                deadline += dt
+                now = time.perf_counter()
+                if deadline > now:
+                    time.sleep(deadline - now)
 
     # def apply_action(self, action: Dict[str, Any]) -> None:
     #     raw_action = action.get("actions")
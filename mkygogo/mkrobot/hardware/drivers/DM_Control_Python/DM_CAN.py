@@ -1,4 +1,6 @@
 from time import sleep
+from time import monotonic
+import selectors
 import numpy as np
 from enum import IntEnum
 from struct import unpack
@@ -86,6 +88,13 @@ class MotorControl:
             print("Serial port is open")
             serial_device.close()
         self.serial_.open()
+        # register the fd once for event-driven reply waits
+        # 注册一次串口 fd，等回复时用 select 阻塞而不是定时轮询
+        try:
+            self.selector_ = selectors.DefaultSelector()
+            self.selector_.register(self.serial_.fileno(), selectors.EVENT_READ)
+        except (OSError, ValueError, AttributeError):
+            self.selector_ = None
 
     def controlMIT(self, DM_Motor, kp: float, kd: float, q: float, dq: float, tau: float):
         """
@@ -157,6 +166,31 @@ class MotorControl:
         # time.sleep(0.001)
         self.recv()  # receive the data from serial port
 
+    def control_Pos_Vel_all(self, Motors, positions, V_desired: float):
+        """
+        batch position-velocity command, one serial write for all motors
+        批量位置速度控制：所有电机的指令帧拼成一段，一次串口写下发
+        :param Motors: iterable of Motor objects 电机对象列表
+        :param positions: desired position per motor 每个电机的期望位置
+        :param V_desired: desired velocity (shared) 共用的期望速度
+        :return: None
+        """
+        frames = bytearray()
+        V_desired_uint8s = float_to_uint8s(V_desired)
+        for Motor, P_desired in zip(Motors, positions):
+            if Motor.SlaveID not in self.motors_map:
+                print("control_Pos_Vel_all Error : Motor ID not found")
+                continue
+            motorid = 0x100 + Motor.SlaveID
+            self.send_data_frame[13] = motorid & 0xff
+            self.send_data_frame[14] = (motorid >> 8) & 0xff
+            self.send_data_frame[21:25] = float_to_uint8s(P_desired)
+            self.send_data_frame[25:29] = V_desired_uint8s
+            frames += self.send_data_frame.tobytes()
+        if frames:
+            self.serial_.write(bytes(frames))
+            self.recv()  # receive the data from serial port
+
     def control_Vel(self, Motor, Vel_desired):
         """
         control the motor in velocity control mode 电机速度控制模式
@@ -415,6 +449,51 @@ class MotorControl:
         self.__send_data(0x7FF, data_buf)
         self.recv()  # receive the data from serial port
 
+    def refresh_motor_status_all(self, Motors):
+        """
+        get the status of several motors with pipelined queries 批量获得多个电机状态
+        send all query frames first, then parse all replies in one pass,
+        instead of one request/response round-trip per motor
+        :param Motors: iterable of Motor objects 电机对象列表
+        """
+        # no broadcast status opcode in this protocol, so coalesce the
+        # per-motor query frames into one buffer and submit with one write
+        # 协议没有广播查询，把逐电机的查询帧拼成一段一次写出
+        frames = bytearray()
+        n = 0
+        self.send_data_frame[13] = 0x7FF & 0xff
+        self.send_data_frame[14] = (0x7FF >> 8) & 0xff
+        for Motor in Motors:
+            can_id_l = Motor.SlaveID & 0xff  # id low 8 bits
+            can_id_h = (Motor.SlaveID >> 8) & 0xff  # id high 8 bits
+            data_buf = np.array([np.uint8(can_id_l), np.uint8(can_id_h), 0xCC, 0x00, 0x00, 0x00, 0x00, 0x00], np.uint8)
+            self.send_data_frame[21:29] = data_buf
+            frames += self.send_data_frame.tobytes()
+            n += 1
+        if n == 0:
+            return
+        self.serial_.write(bytes(frames))
+        # block until every reply frame is buffered, then parse them in one pass
+        # 等所有回复帧到齐再统一解析，避免 read_all 读到半截丢一轮状态
+        self.__wait_for_bytes(16 * n)
+        self.recv()  # receive the data from serial port
+
+    def __wait_for_bytes(self, nbytes, timeout=0.02):
+        """
+        wait on the serial fd until nbytes are buffered (or timeout)
+        在 fd 上等够 nbytes 个字节，事件驱动阻塞而非 sleep 轮询
+        :param nbytes: expected reply size in bytes 期望的回复字节数
+        :param timeout: max wait in seconds 最长等待秒数
+        """
+        if self.selector_ is None:
+            return
+        deadline = monotonic() + timeout
+        while self.serial_.in_waiting < nbytes:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            self.selector_.select(timeout=remaining)
+
     def change_motor_param(self, Motor, RID, data):
         """
         change the RID of the motor 改变电机的参数
@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from functools import cached_property
 import numpy as np
+import os
 import serial
 import time
 import logging
@@ -41,6 +42,17 @@ class MKRobotStandalone:
         else:
             self.camera_indices = camera_indices
         self.cameras = {}
+        # 每路相机一个后台采集线程，只保留最新一帧 (cap.read 会释放 GIL，真并行)
+        self._latest_frames: Dict[str, Any] = {}
+        # 每采到一帧序号 +1，下游靠它判断帧新旧 (缓冲地址会被 malloc 复用，不可靠)
+        self._frame_seq: Dict[str, int] = {}
+        self._frame_lock = threading.Lock()
+        self._capture_threads = []
+        self._capture_running = False
+        # 可选的采集线程降采样：config 里给 target_hw=(h, w) 就在
+        # 采集线程里 INTER_AREA 缩到目标尺寸 (双缓冲)，下游少搬 ~8x 字节
+        self._cap_target: Dict[str, Any] = {}
+        self._cap_resize: Dict[str, Any] = {}
         self.serial_conn = None
         self.control = None
         self.is_connected = False
@@ -64,6 +76,13 @@ class MKRobotStandalone:
         # ------------------------------------------------------------
         self.HARDWARE_DIR = np.array([-1.0, 1.0, -1.0, -1.0, -1.0, -1.0, 1.0], dtype=np.float32)
 
+        # 限位提前摆成两个 (7,) 数组，热路径一次 np.clip 搞定
+        # 前6个来自 JOINT_LIMITS，第7个是夹爪 [0, 1]
+        self._joint_lo = np.array([JOINT_LIMITS[i][0] for i in range(6)] + [0.0], dtype=np.float32)
+        self._joint_hi = np.array([JOINT_LIMITS[i][1] for i in range(6)] + [1.0], dtype=np.float32)
+        # clip 的输出缓冲：限位结果在同一个控制周期内用完即弃，复用一块
+        self._clip_buf = np.empty(7, dtype=np.float32)
+
         # 初始化电机
         if DRIVERS_AVAILABLE:
             self.motors = {
@@ -76,7 +95,43 @@ class MKRobotStandalone:
                 "gripper": Motor(DM_Motor_Type.DM4310, 0x07, 0x17),
             }
         else:
-            self.motors = {}    
+            self.motors = {}
+
+        # 电机遍历顺序固定，提前缓存成 tuple，热循环整数下标直取
+        # 约定下标 0-5 是 joint_1..joint_6，下标 6 是夹爪
+        self._motor_keys = tuple(self.motors.keys())
+        self._motor_list = tuple(self.motors.values())
+
+        # 关节状态复用两块 (7,) 缓冲：填原始值 -> 乘方向系数，均不新建数组
+        self._state_buf = np.zeros(7, dtype=np.float32)
+        self._sim_state_buf = np.zeros(7, dtype=np.float32)
+        # 发送路径的方向换算也写进固定缓冲，30-100Hz 循环零分配
+        self._act_buf = np.empty(7, dtype=np.float32)
+
+        # 增量门限：目标没动的电机不重发指令，省串口带宽
+        # NaN 初值保证首次调用一定全发
+        self.SEND_EPS = 1e-3  # rad，低于电机分辨率的变化视为没动
+        self._last_sent = np.full(7, np.nan, dtype=np.float32)
+
+        # 串口工作线程的共享缓冲：策略循环两侧只碰内存，串口收发全在
+        # 工作线程里连续流水 (读状态 <-> 发指令交替，链路不空转)
+        self._io_lock = threading.Lock()
+        self._io_state = np.zeros(7, dtype=np.float32)   # 最近一轮读回的物理状态
+        self._io_state_valid = False
+        self._cmd_buf = np.zeros(7, dtype=np.float32)    # 最新待发 (仿真系) 目标
+        self._cmd_snapshot = np.empty(7, dtype=np.float32)
+        self._cmd_dirty = threading.Event()
+        self._serial_running = False
+        self._serial_thread = None
+
+        # 夹爪 [0,1] <-> 电机位置的线性映射系数提前算好，热路径内联乘加
+        self._grip_span = self.gripper_closed_pos - self.gripper_open_pos
+        self._grip_span_inv = 1.0 / self._grip_span
+
+        # 控制指令里用到的速度/电流常量提前乘好，发送路径不再做算术
+        self._joint_vel = self.joint_velocity_scaling * self.DM4340_SPEED
+        self._gripper_vel = self.DM4310_SPEED * self.EMIT_VELOCITY_SCALE
+        self._gripper_i = self.max_gripper_torque / self.DM4310_TORQUE_CONSTANT * self.EMIT_CURRENT_SCALE
 
     def configure(self) -> None:
         for key, motor in self.motors.items():
@@ -126,7 +181,10 @@ class MKRobotStandalone:
             self.motors["gripper"], Control_Type.VEL)
         self.control.control_Vel(self.motors["gripper"], 10.0)
         while True:
-            self.control.refresh_motor_status(self.motors["gripper"])
+            # 批量刷新内部会在串口 fd 上阻塞到回复帧到齐，循环节奏由
+            # 串口事件驱动；去掉 10ms 定时轮询后，堵转检测最多晚一个
+            # CAN 往返，而不是晚一个轮询周期
+            self.control.refresh_motor_status_all((self.motors["gripper"],))
             tau = self.motors["gripper"].getTorque()
             if tau > 0.6: #0.8
                 self.control.control_Vel(self.motors["gripper"], 0.0)
@@ -135,13 +193,40 @@ class MKRobotStandalone:
                 time.sleep(0.2)
                 self.control.enable(self.motors["gripper"])
                 break
-            time.sleep(0.01)
         self.control.switchControlMode(
             self.motors["gripper"], Control_Type.Torque_Pos)
 
     # @property
     # def is_connected(self) -> bool:
-    #     return self.bus_connected 
+    #     return self.bus_connected
+
+    def _set_serial_low_latency(self) -> None:
+        """
+        把 USB 串口切到低延迟模式 (仅 Linux，失败静默跳过)
+        FTDI 默认 latency_timer=16ms，每次 CAN 收发都要吃满这个等待；
+        降到 1ms 后单条指令往返从 ~32ms 降到 ~4ms
+        """
+        # FTDI: sysfs 上的 latency_timer 节点
+        try:
+            dev = os.path.basename(os.path.realpath(self.port))
+            latency_path = f"/sys/bus/usb-serial/devices/{dev}/latency_timer"
+            with open(latency_path, "w") as f:
+                f.write("1")
+            print(f"⚡ Serial latency_timer set to 1ms ({dev})")
+        except OSError:
+            pass
+
+        # 通用: serial_struct 的 ASYNC_LOW_LATENCY 标志位
+        try:
+            import array
+            import fcntl
+            import termios
+            buf = array.array('i', [0] * 64)
+            fcntl.ioctl(self.serial_device.fileno(), termios.TIOCGSERIAL, buf)
+            buf[4] |= 0x2000  # ASYNC_LOW_LATENCY
+            fcntl.ioctl(self.serial_device.fileno(), termios.TIOCSSERIAL, buf)
+        except (ImportError, OSError, AttributeError):
+            pass
 
     def connect(self) -> None:
         if self.is_connected:
@@ -150,10 +235,13 @@ class MKRobotStandalone:
 
         self.serial_device = serial.Serial(
             self.port, 921600, timeout=0.5)
+        self._set_serial_low_latency()
         time.sleep(0.3)
 
         self.control = MotorControl(self.serial_device)
         self.is_connected = True
+        # 重连后清空增量门限记录，保证第一帧指令全量下发
+        self._last_sent[:] = np.nan
         self.configure()
 
         for name, config in self.camera_indices.items():
@@ -162,117 +250,184 @@ class MKRobotStandalone:
                 if isinstance(config, int):
                     idx = config
                     w, h = 640, 480 # 旧代码的默认值
+                    target_hw = None
                 elif isinstance(config, dict):
                     idx = config.get('index', 0)
                     w = config.get('width', 640)
                     h = config.get('height', 480)
+                    target_hw = config.get('target_hw')
                 else:
                     continue
 
+                self._cap_target[name] = tuple(target_hw) if target_hw else None
+                if target_hw:
+                    th, tw = target_hw
+                    # 双缓冲：写一块发一块，消费方拿到的帧不会被下一次 resize 撕裂
+                    self._cap_resize[name] = [
+                        np.empty((th, tw, 3), dtype=np.uint8),
+                        np.empty((th, tw, 3), dtype=np.uint8),
+                    ]
+
                 # 2. 设置摄像头
-                cap = cv2.VideoCapture(idx)
+                # 显式走 V4L2 + MJPG：相机片上压缩，USB 带宽降 ~5x，
+                # 解码交给 OpenCV 的 SIMD JPEG；BUFFERSIZE=1 保证拿到的是最新帧
+                try:
+                    cap = cv2.VideoCapture(idx, cv2.CAP_V4L2)
+                    if not cap.isOpened():
+                        cap = cv2.VideoCapture(idx)
+                    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                    cap.set(cv2.CAP_PROP_FPS, 30)
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                except Exception:
+                    cap = cv2.VideoCapture(idx)
                 cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
                 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
                 
                 # 3. 存储对象
                 if cap.isOpened():
                     self.cameras[name] = cap
-                    print(f"📷 Camera '{name}' connected: Index={idx}, Res={w}x{h}")
+                    # 回读 FOURCC 确认 MJPG 真的生效 (有些 UVC 相机会默默拒绝)
+                    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+                    fourcc_str = "".join(chr((fourcc >> 8 * k) & 0xFF) for k in range(4))
+                    print(f"📷 Camera '{name}' connected: Index={idx}, Res={w}x{h}, FOURCC={fourcc_str}")
+                    if fourcc_str != "MJPG":
+                        print(f"⚠️ Camera '{name}' did not accept MJPG (got {fourcc_str}), FPS may be limited.")
                 else:
                     print(f"⚠️ Warning: Camera '{name}' (Index {idx}) failed to open.")
                     
             except Exception as e:
                 print(f"❌ Error initializing camera {name}: {e}")
 
+        # 启动采集线程：top/wrist 并行取帧，观测路径只拿现成的最新帧
+        self._capture_running = True
+        for name, cap in self.cameras.items():
+            t = threading.Thread(target=self._capture_loop, args=(name, cap), daemon=True)
+            t.start()
+            self._capture_threads.append(t)
+
+        # 启动串口工作线程：状态刷新和指令下发在后台连续流水
+        self._serial_running = True
+        self._serial_thread = threading.Thread(target=self._serial_loop, daemon=True)
+        self._serial_thread.start()
+
+    def _serial_loop(self) -> None:
+        """
+        [后台线程] 串口收发流水线：循环做「刷一轮全电机状态 -> 若有
+        新指令立刻下发」。策略循环的 get_observation/send_action 只
+        读写内存缓冲，观测和下发不再互相排队等串口 RTT
+        节奏由 recv 的串口读超时自然限定，不需要额外 sleep
+        """
+        while self._serial_running:
+            try:
+                with self.serial_lock:
+                    state = self._get_observation()
+                if state is not None:
+                    with self._io_lock:
+                        self._io_state[:] = state
+                        self._io_state_valid = True
+
+                if self._cmd_dirty.is_set():
+                    with self._io_lock:
+                        self._cmd_snapshot[:] = self._cmd_buf
+                        self._cmd_dirty.clear()
+                    self._issue_command(self._cmd_snapshot)
+            except Exception as e:
+                logger.error(f"Serial worker error: {e}")
+                time.sleep(0.01)
+
+    def _capture_loop(self, name: str, cap) -> None:
+        """
+        [后台线程] 持续读取单路相机并更新最新帧槽位
+        USB 相机的 cap.read 会阻塞约一个帧周期，放线程里互相重叠
+        """
+        target = self._cap_target.get(name)
+        bufs = self._cap_resize.get(name)
+        buf_idx = 0
+        while self._capture_running and cap.isOpened():
+            # grab/retrieve 拆开：grab 只收 USB 包不解码，两路相机的
+            # 传输能互相重叠；JPEG 解码推迟到 retrieve 再做
+            if not cap.grab():
+                time.sleep(0.005)
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
+            if target is not None:
+                # 采集线程就地缩到目标尺寸，下游只搬小图
+                th, tw = target
+                dst = bufs[buf_idx]
+                buf_idx ^= 1
+                cv2.resize(frame, (tw, th), dst=dst, interpolation=cv2.INTER_AREA)
+                frame = dst
+            # BGR->RGB 只是通道换序：负步长视图零拷贝，后面的 resize 会吃掉 stride
+            rgb = frame[..., ::-1]
+            with self._frame_lock:
+                self._latest_frames[name] = rgb
+                self._frame_seq[name] = self._frame_seq.get(name, 0) + 1
+
     def get_observation(self) -> Dict[str, Any]:
         """
         对外接口: 适配 env.py
         返回: {'state': np.ndarray, 'images': dict}
         """
         #print("✅✅✅ YES! NEW CODE IS RUNNING! ✅✅✅")
-        with self.serial_lock:
-            raw_obs = self._get_observation()
+        # 工作线程持续刷新 _io_state，这里只做一次内存快照
+        # 首轮刷新没完成前 (valid=False) 退回直接串口读，行为不变
+        if self._serial_running and self._io_state_valid:
+            with self._io_lock:
+                np.multiply(self._io_state, self.HARDWARE_DIR, out=self._sim_state_buf)
+            raw_obs = self._sim_state_buf
+        else:
+            with self.serial_lock:
+                raw_obs = self._get_observation()
+            if raw_obs is not None:
+                np.multiply(raw_obs, self.HARDWARE_DIR, out=self._sim_state_buf)
 
         if raw_obs is None:
             return {"state": np.zeros(7, dtype=np.float32), "images": {}}
+        # 返回副本：调用方 (test 脚本等) 会在拿到的数组上原地改目标值
+        sim_state = self._sim_state_buf.copy()
 
-        # 1. 解析 State 字典转 Array
-        # 你的 _get_observation 返回的是 {'joint_1.pos': val, ...}
-        # 我们需要按 j1...j6, gripper 的顺序拼成 (7,) 数组
-        # q_list = []
-        # for i in range(1, 7):
-        #     key = f"joint_{i}.pos"
-        #     q_list.append(raw_obs.get(key, 0.0))
-        # # 夹爪
-        # q_list.append(raw_obs.get("gripper.pos", 0.0))
-        q_list = [
-            raw_obs.get("joint_1.pos", 0.0),
-            raw_obs.get("joint_2.pos", 0.0),
-            raw_obs.get("joint_3.pos", 0.0),
-            raw_obs.get("joint_4.pos", 0.0),
-            raw_obs.get("joint_5.pos", 0.0),
-            raw_obs.get("joint_6.pos", 0.0),
-            raw_obs.get("gripper.pos", 0.0)
-        ]
-        
-        physical_state = np.array(q_list, dtype=np.float32)
-        sim_state = physical_state * self.HARDWARE_DIR
-        #state_array = np.array(q_list, dtype=np.float32)
-
-        # 2. 图像直接透传 (假设 _get_observation 里的 images 逻辑已经处理了)
-        # 注意：看你原来的代码，_get_observation 里 images 变量虽然生成了但没塞进 return 的字典里
-        # 这里我做个补救，重新读取一次图像，或者你可以修改 _get_observation 让它返回 images
-        
-        # 为了不改动你的 _get_observation，我在这里单独读一次相机
+        # 2. 图像从采集线程的最新帧槽位取，观测路径不再阻塞在 cap.read 上
+        #    帧序号和帧在同一把锁下快照，二者保证对应
         images = {}
-        for name, cap in self.cameras.items():
-            if cap.isOpened():
-                ret, frame = cap.read()
-                if ret:
-                    images[name] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                else:
-                    images[name] = np.zeros((480, 640, 3), dtype=np.uint8)
-            else:
-                images[name] = np.zeros((480, 640, 3), dtype=np.uint8)
+        image_seqs = {}
+        with self._frame_lock:
+            for name in self.cameras:
+                frame = self._latest_frames.get(name)
+                images[name] = frame if frame is not None else np.zeros((480, 640, 3), dtype=np.uint8)
+                image_seqs[name] = self._frame_seq.get(name, 0)
 
-        return {"state": sim_state, "images": images}
+        return {"state": sim_state, "images": images, "image_seqs": image_seqs}
 
-    def _get_observation(self) -> dict[str, Any]:
+    def _get_observation(self) -> np.ndarray:
         if not self.is_connected:
             print(f"{self} is not connected.")
             return
 
-        # Read arm position
-        start = time.perf_counter()
+        # 🚀 一次性把 7 个状态查询全发出去，再统一收回复
+        # 串口上 7 次 RTT 变成一条流水线
+        self.control.refresh_motor_status_all(self._motor_list)
 
-        obs_dict = {}
-        for key, motor in self.motors.items():
-            self.control.refresh_motor_status(motor)
-            if 0: 
-                pass
-            if key == "gripper":
-                # Normalize gripper position between 1 (closed) and 0 (open)
-                obs_dict[f"{key}.pos"] = map_range(
-                    motor.getPosition(), self.gripper_open_pos, self.gripper_closed_pos, 0.0, 1.0)
-            else:
-                obs_dict[f"{key}.pos"] = motor.getPosition()
+        # 整数下标直接写进 (7,) 缓冲：不再走 {'joint_1.pos': ...} 字典
+        # 和 f-string 键拼接那一圈
+        buf = self._state_buf
+        for i, motor in enumerate(self._motor_list):
+            buf[i] = motor.getPosition()
+        # Normalize gripper position between 1 (closed) and 0 (open)
+        # 标定误差可能让读数略超行程，顺手夹回 [0, 1]
+        buf[6] = min(1.0, max(0.0, (buf[6] - self.gripper_open_pos) * self._grip_span_inv))
 
-        return obs_dict
+        return buf
 
     def check_joints_limit(self, action_array: np.ndarray) -> np.ndarray:
         if action_array is None:
             return np.zeros(7, dtype=np.float32)
-            
-        safe_action = action_array.copy()
-        
-        for i in range(6):
-            if i in JOINT_LIMITS:
-                min_lim, max_lim = JOINT_LIMITS[i]
-                safe_action[i] = np.clip(safe_action[i], min_lim, max_lim)
-        
-        # 夹爪限位
-        safe_action[6] = np.clip(safe_action[6], 0.0, 1.0)
-        return safe_action  
+
+        # 含夹爪在内 7 个维度一次向量化截断，结果写进预分配缓冲不再新建数组
+        # 注意：返回的是共享缓冲，下一次调用会覆盖，调用方须当帧用完
+        np.clip(action_array, self._joint_lo, self._joint_hi, out=self._clip_buf)
+        return self._clip_buf
 
     def send_action(self, action: np.ndarray):
         """
@@ -295,22 +450,52 @@ class MKRobotStandalone:
         #if action.size >= 7:
         #    action = action.flatten()[:7]
 
-        target_physical = action * self.HARDWARE_DIR
+        if self._serial_running:
+            # 只更新共享目标并打脏标记，串口写入交给工作线程
+            # 连续两次调用只会发最新目标 (drop-oldest)，不会排队
+            with self._io_lock:
+                self._cmd_buf[:] = action
+            self._cmd_dirty.set()
+        else:
+            self._issue_command(action)
+
+    def _issue_command(self, action: np.ndarray) -> None:
+        """
+        把 (7,) 仿真系动作真正写上串口 (限位截断 + 增量门限)
+        由串口工作线程调用；线程没启动时 send_action 直接调它
+        """
+        np.multiply(action, self.HARDWARE_DIR, out=self._act_buf)
+        target_physical = self._act_buf
 
         # 1. 安全防护：限位检查
-        # 你的 _send_action 里是直接执行，所以在传给它之前必须截断
         safe_action_arr = self.check_joints_limit(target_physical)
 
-        # 2. 构造 _send_action 需要的字典格式
-        # 格式: {'joint_1.pos': val, ..., 'gripper.pos': val}
-        action_dict = {}
-        for i in range(6):
-            action_dict[f"joint_{i+1}.pos"] = safe_action_arr[i]
-        
-        action_dict["gripper.pos"] = safe_action_arr[6]
+        # 增量门限：写法上用 ~(delta <= eps)，这样 NaN (首次) 也判为要发
+        delta = np.abs(safe_action_arr - self._last_sent)
+        send_mask = ~(delta <= self.SEND_EPS)
+        if not send_mask.any():
+            return
 
+        # 2. 直接按固定顺序下发电机指令
+        # 不再绕 {'joint_1.pos': ...} 字典 + removesuffix 字符串解析一圈
         with self.serial_lock:
-            self._send_action(action_dict)
+            # 有变化的关节指令帧拼成一段，一次串口写发出去
+            # 6 次 write 系统调用 + 6 次 recv 变成 1 次
+            moved = [i for i in range(6) if send_mask[i]]
+            if moved:
+                self.control.control_Pos_Vel_all(
+                    [self._motor_list[i] for i in moved],
+                    [float(safe_action_arr[i]) for i in moved],
+                    self._joint_vel)
+
+            if send_mask[6]:
+                gripper = self._motor_list[6]
+                # 不再先 refresh：目标位置不依赖当前位置，而且观测路径
+                # 1-2ms 前刚查过一轮，这里省掉一次完整的 CAN 往返
+                gripper_goal = self.gripper_open_pos + float(safe_action_arr[6]) * self._grip_span
+                self.control.control_pos_force(gripper, gripper_goal, self._gripper_vel, i_des=self._gripper_i)
+
+        self._last_sent[send_mask] = safe_action_arr[send_mask]
 
     def _send_action(self, action: dict[str, Any]) -> dict[str, Any]:
         if not self.is_connected:
@@ -340,6 +525,13 @@ class MKRobotStandalone:
            print(f"{self} is not connected.")
            return
 
+        # 先停串口工作线程，失能指令不跟后台刷新抢总线
+        self._serial_running = False
+        if self._serial_thread is not None:
+            self._serial_thread.join(timeout=1.0)
+            self._serial_thread = None
+        self._io_state_valid = False
+
         # 默认策略：断开连接前，先让电机失能(卸力)，防止意外
         try:
             for motor in self.motors.values():
@@ -355,7 +547,12 @@ class MKRobotStandalone:
             logger.error(f"Error closing serial port: {e}")
         self.is_connected = False
 
-        for cap in self.cameras.values(): 
+        # 先停采集线程，再释放相机
+        self._capture_running = False
+        for t in self._capture_threads:
+            t.join(timeout=1.0)
+        self._capture_threads.clear()
+        for cap in self.cameras.values():
             cap.release()
 
         logger.info(f"{self} disconnected.")
@@ -1,6 +1,7 @@
 import sys
 import tty
 import termios
+import select
 import time
 import numpy as np
 import os
@@ -14,6 +15,11 @@ except ImportError:
     print("运行命令示例: uv run python test_robot.py")
     sys.exit(1)
 
+# 限位提前摆成 (7,) 上下界数组 (关节来自 JOINT_LIMITS，夹爪 [0,1])
+# 更新目标后一次 np.clip 全量截断，不再逐键查字典分支
+LIMIT_LO = np.array([JOINT_LIMITS[i][0] for i in range(6)] + [0.0], dtype=np.float32)
+LIMIT_HI = np.array([JOINT_LIMITS[i][1] for i in range(6)] + [1.0], dtype=np.float32)
+
 # ==========================================
 # 键盘输入处理 (Linux Terminal)
 # ==========================================
@@ -24,6 +30,12 @@ class KeyboardInput:
 
     def __enter__(self):
         tty.setraw(sys.stdin.fileno())
+        # 进场时一次性设好 VMIN=1/VTIME=0 (阻塞式单字节读)
+        # get_key 里就不用每个 ESC 都来回 tcgetattr/tcsetattr 折腾
+        attrs = termios.tcgetattr(self.fd)
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, attrs)
         return self
 
     def __exit__(self, type, value, traceback):
@@ -31,25 +43,20 @@ class KeyboardInput:
 
     def get_key(self):
         """读取按键，支持识别箭头键和ESC"""
-        ch = sys.stdin.read(1)
-        if ch == '\x1b':  # ESC 或 转义序列起始
-            # 设置非阻塞读取来检查是否有后续字符
-            old_settings = termios.tcgetattr(self.fd)
-            new_settings = termios.tcgetattr(self.fd)
-            new_settings[6][termios.VMIN] = 0
-            new_settings[6][termios.VTIME] = 0
-            termios.tcsetattr(self.fd, termios.TCSADRAIN, new_settings)
-            
-            try:
-                ch2 = sys.stdin.read(1)
-                ch3 = sys.stdin.read(1)
-                if ch2 == '[':
-                    if ch3 == 'A': return 'UP'
-                    if ch3 == 'B': return 'DOWN'
-                return 'ESC'
-            finally:
-                termios.tcsetattr(self.fd, termios.TCSADRAIN, old_settings)
-        return ch
+        # 一次 os.read 吃下整个转义序列 (箭头键 3 字节一般一包送达)，
+        # 不再一个字节一次系统调用
+        buf = os.read(self.fd, 8)
+        if buf.startswith(b'\x1b'):
+            # 万一终端把序列拆包，用 select 补读剩余字节
+            # 单独按 ESC 时 50ms 内等不到字节，直接判定为 ESC
+            if buf == b'\x1b' and select.select([sys.stdin], [], [], 0.05)[0]:
+                buf += os.read(self.fd, 8)
+            if buf.startswith(b'\x1b['):
+                ch3 = buf[2:3]
+                if ch3 == b'A': return 'UP'
+                if ch3 == b'B': return 'DOWN'
+            return 'ESC'
+        return buf.decode(errors='ignore')[:1]
 
 # ==========================================
 # 机器人控制逻辑
@@ -68,12 +75,14 @@ def main():
 
     # 1. 初始化目标位置为当前实际位置 (防止瞬移)
     obs = robot.get_observation()
-    # 确保是 float32 数组
-    target_pos = obs["state"].copy().astype(np.float32)
+    # 转 float32 + 拷贝一步到位，不再先 copy 再 astype 分配两次
+    target_pos = np.array(obs["state"], dtype=np.float32)
     
     # 定义步长
     JOINT_STEP = 0.05  # 关节每次调整幅度 (rad)
     GRIPPER_STEP = 0.1 # 夹爪每次调整幅度 (0-1)
+    MIN_TX_INTERVAL = 1 / 150.0  # 按键连发时合并目标，最高 150Hz 下发
+    last_tx = 0.0
 
     print("\n" + "="*50)
     print(" 🎮 机械臂键盘控制器 (Test Robot)")
@@ -104,15 +113,35 @@ def main():
                     print(" [↑] 增加角度/闭合  [↓] 减小角度/张开  [q] 返回上级")
                     
                     # --- 单电机控制循环 ---
+                    last_print = 0.0
+                    pending_tx = False  # 限频窗口里合并了目标但还没下发
                     while True:
                         current_val = target_pos[motor_idx]
-                        
-                        # 实时显示当前值
-                        print(f"\r{motor_name} 目标值: {current_val:.3f}   ", end='', flush=True)
-                        
+
+                        # 状态行最多 20Hz 刷新，按键连发时省掉大部分 write 调用
+                        now = time.monotonic()
+                        if now - last_print > 0.05:
+                            sys.stdout.write(f"\r{motor_name} 目标值: {current_val:.3f}   ")
+                            sys.stdout.flush()
+                            last_print = now
+
+                        # 有合并未发的目标时不能直接扎进阻塞读：
+                        # 等限频窗口走完还没新按键，就把最新目标补发出去
+                        # (不然连发的最后一下永远停在屏幕上、到不了机器人)
+                        if pending_tx:
+                            wait = MIN_TX_INTERVAL - (time.monotonic() - last_tx)
+                            if wait <= 0 or not select.select([sys.stdin], [], [], wait)[0]:
+                                robot.send_action(target_pos)
+                                last_tx = time.monotonic()
+                                pending_tx = False
+
                         cmd_key = kb.get_key()
-                        
+
                         if cmd_key == 'q':
+                            if pending_tx:  # 返回菜单前把欠发的目标补上
+                                robot.send_action(target_pos)
+                                last_tx = time.monotonic()
+                                pending_tx = False
                             break
                         
                         # 计算新目标
@@ -126,21 +155,21 @@ def main():
                         else:
                             continue # 忽略其他按键
 
-                        # 限位检查 (Software Limit)
-                        if motor_idx in JOINT_LIMITS:
-                            min_l, max_l = JOINT_LIMITS[motor_idx]
-                            new_val = np.clip(new_val, min_l, max_l)
-                        elif motor_idx == 6: # 夹爪
-                            new_val = np.clip(new_val, 0.0, 1.0)
-                        
-                        # 更新全局目标数组
+                        # 更新目标后向量化限位 (Software Limit)，7 个维度一起夹
                         target_pos[motor_idx] = new_val
-                        
+                        np.clip(target_pos, LIMIT_LO, LIMIT_HI, out=target_pos)
+
+                        # 限频下发：按键连发超过 150Hz 时只更新目标不发包，
+                        # 标记 pending，窗口结束由上面的 flush 补发最新目标
+                        now = time.monotonic()
+                        if now - last_tx < MIN_TX_INTERVAL:
+                            pending_tx = True
+                            continue
+                        last_tx = now
+                        pending_tx = False
+
                         # 发送动作 (发送包含所有关节的完整数组)
                         robot.send_action(target_pos)
-                        
-                        # 稍微延时，避免发送太快
-                        time.sleep(0.01)
 
     except KeyboardInterrupt:
         print("\n用户强制中断")
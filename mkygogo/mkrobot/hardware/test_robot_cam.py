@@ -1,6 +1,8 @@
+import os
 import sys
 import tty
 import termios
+import select
 import time
 import numpy as np
 import threading
@@ -23,10 +25,17 @@ CAMERA_CONFIG = {
 }
 # ===========================================
 
-# 全局变量，用于线程间通信
-latest_obs = None
+# 限位提前摆成 (7,) 上下界数组，更新目标后一次 np.clip 全量截断
+LIMIT_LO = np.array([JOINT_LIMITS[i][0] for i in range(6)] + [0.0], dtype=np.float32)
+LIMIT_HI = np.array([JOINT_LIMITS[i][1] for i in range(6)] + [1.0], dtype=np.float32)
+
+# 线程间通信：单生产者(相机线程)/单消费者(主线程)的环形缓冲
+# 生产者只写 obs_ring[seq % N] 再递增 obs_seq，消费者只读最新一格；
+# GIL 保证整数和槽位赋值原子，不需要锁，旧帧自动被覆盖丢弃
+OBS_RING_SIZE = 4
+obs_ring = [None] * OBS_RING_SIZE
+obs_seq = 0
 running = True
-obs_lock = threading.Lock()
 
 # ==========================================
 # 键盘输入处理 (非阻塞)
@@ -38,70 +47,103 @@ class KeyboardInput:
 
     def __enter__(self):
         tty.setraw(sys.stdin.fileno())
+        # 一次性设好 VMIN=1/VTIME=0，get_key 不再每个 ESC 改 termios
+        attrs = termios.tcgetattr(self.fd)
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSADRAIN, attrs)
         return self
 
     def __exit__(self, type, value, traceback):
         termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
 
     def get_key(self):
-        ch = sys.stdin.read(1)
-        if ch == '\x1b':
-            old_settings = termios.tcgetattr(self.fd)
-            new_settings = termios.tcgetattr(self.fd)
-            new_settings[6][termios.VMIN] = 0
-            new_settings[6][termios.VTIME] = 0
-            termios.tcsetattr(self.fd, termios.TCSADRAIN, new_settings)
-            try:
-                ch2 = sys.stdin.read(1)
-                ch3 = sys.stdin.read(1)
-                if ch2 == '[':
-                    if ch3 == 'A': return 'UP'
-                    if ch3 == 'B': return 'DOWN'
-                return 'ESC'
-            finally:
-                termios.tcsetattr(self.fd, termios.TCSADRAIN, old_settings)
-        return ch
+        # 一次 os.read 吃下整个转义序列，箭头键从 3 次系统调用变 1 次
+        buf = os.read(self.fd, 8)
+        if buf.startswith(b'\x1b'):
+            # 万一序列被拆包，select 探测后补读；单独 ESC 50ms 后返回
+            if buf == b'\x1b' and select.select([sys.stdin], [], [], 0.05)[0]:
+                buf += os.read(self.fd, 8)
+            if buf.startswith(b'\x1b['):
+                ch3 = buf[2:3]
+                if ch3 == b'A': return 'UP'
+                if ch3 == b'B': return 'DOWN'
+            return 'ESC'
+        return buf.decode(errors='ignore')[:1]
 
 # ==========================================
 # 摄像头显示线程
 # ==========================================
+DISPLAY_PERIOD = 1 / 30.0  # 显示线程目标帧率
+
+
 def camera_loop(robot):
-    global latest_obs, running
+    global obs_seq, running
     print("📸 摄像头线程已启动...")
-    
+    bgr_bufs = {}
+    last_frame_seqs = {}  # 按驱动的帧序号判断有没有新帧，没有就跳过重绘
+    next_t = time.monotonic()
+
     while running:
         # 1. 获取观测数据 (包含图像和关节状态)
         # 注意：get_observation 会读取摄像头，所以只能在一个线程调用
         obs = robot.get_observation()
+
+        # 2. 写入环形缓冲 (先写槽位再递增序号，消费者永远读到完整帧)
+        obs_ring[obs_seq % OBS_RING_SIZE] = obs
+        obs_seq += 1
         
-        # 2. 更新全局状态 (加锁)
-        with obs_lock:
-            latest_obs = obs
-        
-        # 3. 显示图像
+        # 3. 显示图像 (BGR 转换写进每路复用的缓冲，不再每帧新分配)
         images = obs.get('images', {})
+        image_seqs = obs.get('image_seqs', {})
         if images:
             for name, img in images.items():
                 if img is not None and img.size > 0:
+                    # 采集线程每出一帧序号 +1，序号没动说明还是旧帧，
+                    # 跳过转换和重绘 (数据指针不可靠：malloc 会复用地址)
+                    seq = image_seqs.get(name)
+                    if seq is not None and last_frame_seqs.get(name) == seq:
+                        continue
+                    last_frame_seqs[name] = seq
                     # OpenCV 默认是 BGR，如果驱动返回的是 RGB，需要转换
-                    # 假设驱动返回的是 RGB (根据之前的代码)
-                    bgr_img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                    cv2.imshow(f"Camera: {name}", bgr_img)
-        
-        # 4. 响应 GUI 按键 (按 'q' 退出)
-        if cv2.waitKey(30) & 0xFF == ord('q'):
+                    buf = bgr_bufs.get(name)
+                    if buf is None or buf.shape != img.shape:
+                        buf = np.empty_like(img)
+                        bgr_bufs[name] = buf
+                    cv2.cvtColor(img, cv2.COLOR_RGB2BGR, dst=buf)
+                    cv2.imshow(f"Camera: {name}", buf)
+
+        # 4. pollKey 只抽一次 GUI 事件不睡 30ms；显示节奏由下面的
+        #    绝对截止时间控制，慢帧不再拖累下一帧
+        key = cv2.pollKey()
+        if key != -1 and (key & 0xFF) == ord('q'):
             running = False
             break
 
+        next_t += DISPLAY_PERIOD
+        delay = next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_t = time.monotonic()
+
     cv2.destroyAllWindows()
     print("📸 摄像头线程停止")
 
 # ==========================================
 # 主程序
 # ==========================================
+def latest_observation():
+    """消费者侧取最新一帧观测；还没有数据时返回 None"""
+    seq = obs_seq
+    if seq == 0:
+        return None
+    return obs_ring[(seq - 1) % OBS_RING_SIZE]
+
+
 def main():
-    global running, latest_obs
-    
+    global running
+
     print("正在连接机械臂和摄像头...")
     robot = MKRobotStandalone(
         port="/dev/ttyACM0", 
@@ -122,18 +164,19 @@ def main():
 
     # 等待第一帧数据
     print("等待摄像头画面...")
-    while latest_obs is None and running:
+    while obs_seq == 0 and running:
         time.sleep(0.1)
 
     if not running:
         return
 
-    # 初始化目标位置
-    with obs_lock:
-        target_pos = latest_obs["state"][:7].copy().astype(np.float32)
+    # 初始化目标位置 (转 float32 + 拷贝一步到位)
+    target_pos = np.array(latest_observation()["state"][:7], dtype=np.float32)
 
     JOINT_STEP = 0.05
     GRIPPER_STEP = 0.1
+    MIN_TX_INTERVAL = 1 / 150.0  # 按键连发时合并目标，最高 150Hz 下发
+    last_tx = 0.0
 
     print("\n" + "="*50)
     print(" 🎮 机械臂视觉遥操作 (Test Robot Cam)")
@@ -148,9 +191,8 @@ def main():
         with KeyboardInput() as kb:
             while running:
                 # 显示状态
-                with obs_lock:
-                    curr_real_pos = latest_obs["state"][:7]
-                
+                curr_real_pos = latest_observation()["state"][:7]
+
                 print(f"\r\n当前真实值: {np.round(curr_real_pos, 3)}")
                 print("等待选择电机 (1-7) 或 ESC退出: ", end='', flush=True)
                 
@@ -166,18 +208,37 @@ def main():
                     print(f"\n\n>>> 已选中: {motor_name}")
                     print(" [↑] 增加/闭合  [↓] 减小/张开  [q] 返回")
                     
+                    last_print = 0.0
+                    pending_tx = False  # 限频窗口里合并了目标但还没下发
                     while running:
                         # 每次循环都刷新一下目标值基准，防止误差累积
                         # 但为了控制平滑，这里我们保持 target_pos 独立
-                        print(f"\r{motor_name} 目标: {target_pos[motor_idx]:.3f}   ", end='', flush=True)
-                        
+                        # 状态行最多 20Hz 刷新，连发时省掉大部分 write 调用
+                        now = time.monotonic()
+                        if now - last_print > 0.05:
+                            sys.stdout.write(f"\r{motor_name} 目标: {target_pos[motor_idx]:.3f}   ")
+                            sys.stdout.flush()
+                            last_print = now
+
+                        # 有合并未发的目标时先别扎进阻塞读：窗口走完
+                        # 还没等到新按键就补发最新目标，连发的最后一下才能落地
+                        if pending_tx:
+                            wait = MIN_TX_INTERVAL - (time.monotonic() - last_tx)
+                            if wait <= 0 or not select.select([sys.stdin], [], [], wait)[0]:
+                                robot.send_action(target_pos)
+                                last_tx = time.monotonic()
+                                pending_tx = False
+
                         # 非阻塞检查按键 (这里简化为阻塞读取，因为图像在另一线程)
                         cmd_key = kb.get_key()
-                        
-                        if cmd_key == 'q':
-                            break
-                        if cmd_key == 'ESC':
-                            running = False
+
+                        if cmd_key in ('q', 'ESC'):
+                            if pending_tx:  # 退出前把欠发的目标补上
+                                robot.send_action(target_pos)
+                                last_tx = time.monotonic()
+                                pending_tx = False
+                            if cmd_key == 'ESC':
+                                running = False
                             break
                         
                         # 计算新目标
@@ -191,18 +252,21 @@ def main():
                         else:
                             continue
 
-                        # 限位检查
-                        if motor_idx in JOINT_LIMITS:
-                            min_l, max_l = JOINT_LIMITS[motor_idx]
-                            new_val = np.clip(new_val, min_l, max_l)
-                        elif motor_idx == 6:
-                            new_val = np.clip(new_val, 0.0, 1.0)
-                        
+                        # 更新目标后向量化限位，7 个维度一起夹
                         target_pos[motor_idx] = new_val
-                        
+                        np.clip(target_pos, LIMIT_LO, LIMIT_HI, out=target_pos)
+
+                        # 限频下发：超过 150Hz 的连发只更新目标不发包，
+                        # 标记 pending，窗口结束由上面的 flush 补发最新值
+                        now = time.monotonic()
+                        if now - last_tx < MIN_TX_INTERVAL:
+                            pending_tx = True
+                            continue
+                        last_tx = now
+                        pending_tx = False
+
                         # 发送动作
                         robot.send_action(target_pos)
-                        time.sleep(0.01)
 
     except KeyboardInterrupt:
         pass
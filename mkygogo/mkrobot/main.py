@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 import time
 import tyro
@@ -17,6 +18,10 @@ from mkygogo.mkrobot.mk_controller import RobotResetException
 # 反归一化参数 (必须与录数据时一致)
 JOINT_NORM_SCALE = np.array([3.0, 3.0, 3.0, 1.7, 0.4, 2.0, 1.0], dtype=np.float32)
 
+# 归位目标是常量，模块级建一次并锁写，关停路径不再反复 np.zeros
+HOME_ACTION = np.zeros(7, dtype=np.float32)
+HOME_ACTION.flags.writeable = False
+
 @dataclasses.dataclass
 class Args:
     host: str = "0.0.0.0"
@@ -32,28 +37,21 @@ class Args:
 class NormalizedMKRobotEnv(MKRobotOpenPIEnv):
     def apply_action(self, action: dict):
         if "actions" in action:
-            # 1. 获取原始数据 (可能形状是 (30, 7) 或者 (1, 30, 7))
-            raw_action = np.array(action["actions"], dtype=np.float32)
-            raw = np.array(action["actions"])
-            #print(f"\n🐛 [Main] Wrapper received action shape: {raw.shape}")
+            # 1. 获取原始数据：asarray 在模型已经给 float32 时零拷贝
+            #    (可能形状是 (30, 7) 或者 (1, 30, 7))
+            raw = np.asarray(action["actions"], dtype=np.float32)
             # --- 🛡️ [修正] 删除破坏维度的代码 ---
-            # ❌ 不要 raw_action.flatten() -> 这会把30帧拍扁成一长条
-            # ❌ 不要 raw_action[:7] -> 这会丢掉后29帧，导致卡顿
-            
-            # 2. 维度安全处理 (确保最后是 (N, 7))
-            # 这里的目的是让 numpy 广播乘法能正常工作
-            if raw_action.ndim == 3: # 处理 (1, 30, 7) 这种情况
-                raw_action = raw_action[0] 
-            #print(f"🐛 [Main] After squeeze: {raw_action.shape}")
-            # 此时 raw_action 应该是 (30, 7) 或 (1, 7)
-            
-            # 3. 反归一化 (保留！幅度就靠它了)
-            # numpy 会自动把 (7,) 的系数广播到每一帧上
-            physical_action = raw_action * JOINT_NORM_SCALE
-            
+            # ❌ 不要 raw.flatten()[:7] -> 这会丢掉后29帧，导致卡顿
+
+            # 2. reshape(-1, 7) 一步拍平 batch 维，(30,7)/(1,30,7) 都能吃
+            raw = raw.reshape(-1, 7)
+
+            # 3. 反归一化原地乘 (保留！幅度就靠它了)，不再复制一份
+            np.multiply(raw, JOINT_NORM_SCALE, out=raw)
+
             # 4. 更新回去
-            action["actions"] = physical_action
-            
+            action["actions"] = raw
+
         # 5. 交给父类 (env.py) 去逐帧执行
         super().apply_action(action)
 # =============================================================================
@@ -91,6 +89,10 @@ def main(args: Args):
     logging.info(f"Starting inference at {args.control_hz}Hz with Horizon={args.action_horizon}...")
     print(f"\n>>> 提示词: {args.prompt} <<<")
     print(">>> 机械臂运行中，按 Ctrl+C 停止，按空格键暂停/重置 <<<\n")
+
+    # 单线程执行器：推理挂后台，网络+模型延迟藏在硬件执行时间后面
+    infer_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    pending = None
     try:
         while True:
             # === 单次任务循环 (处理 Space 重置) ===
@@ -99,23 +101,46 @@ def main(args: Args):
                 
                 # 1. 重置环境和策略 (清空缓存)
                 obs = env.reset()
-                policy_client.reset() 
+                policy_client.reset()
 
-                # 2. 推理循环
+                # 2. 流水线推理循环：先把第一次推理发出去
+                pending = infer_executor.submit(policy_client.infer, obs)
+                # Broker 每次只回一帧，env 里 chunk_len==1 不控频；现在相机、
+                # 串口、推理全都不阻塞了，必须在这里按 control_hz 主动定节奏，
+                # 不然循环几毫秒就烧完一个 chunk，串口 worker 把路点全丢掉
+                dt = 1.0 / args.control_hz
+                deadline = time.perf_counter()
                 while not env.is_episode_complete():
-                    # 网络推理
-                    action = policy_client.infer(obs)
-                    
-                    # 执行动作 
+                    # 取上一次推理结果 (只有 chunk 边界才真正等网络)
+                    action = pending.result()
+
+                    # 先用当前观测把下一次推理挂到后台，再执行当前动作，
+                    # 网络往返和硬件回放重叠，chunk 切换不再"一顿一顿"
+                    obs = env.get_observation()
+                    pending = infer_executor.submit(policy_client.infer, obs)
+
+                    # 执行动作
                     # (如果用户按了 Space，这里会抛出 RobotResetException)
                     env.apply_action(action)
-                    
-                    # 获取新观测
-                    obs = env.get_observation()
+
+                    # 绝对 deadline 控频，不累积漂移；慢帧 (比如整段 chunk
+                    # 在 env 里回放过) 不追帧，直接以当前时间为新基准
+                    deadline += dt
+                    now = time.perf_counter()
+                    if deadline > now:
+                        time.sleep(deadline - now)
+                    else:
+                        deadline = now
 
             # 3. 捕获重置信号
             except RobotResetException:
                 print("\n⚠️  [System] 收到重置请求，丢弃当前任务，重新开始...\n")
+                # 在飞的推理还在执行器线程里改 broker 的缓存，必须先取消/
+                # 等它落地再 reset()，不然迟到的 chunk 会把重置后的状态冲掉
+                if pending is not None:
+                    pending.cancel()
+                    concurrent.futures.wait([pending])
+                    pending = None
                 # 跳回 while True 开头，触发下一次 reset()
                 continue
         
@@ -123,13 +148,11 @@ def main(args: Args):
         logging.info("Stopping...")
         #给归位过程加锁，防止二次中断报错
         try:
-            # 创建一个全 0 的姿态作为归位目标 (根据你的机器人实际情况调整)
+            # 全 0 姿态作为归位目标 (根据你的机器人实际情况调整)
             # 注意：这里假设你的归位就是回到 0 位。如果不是，请保留你原有的逻辑
-            target_state = np.zeros(7, dtype=np.float32)
-            
             # 强制执行归位，并忽略期间的任何按键中断
-            env.controller.apply_action(target_state)
-            
+            env.controller.apply_action(HOME_ACTION)
+
         except Exception:
             # 如果在归位时用户又狂按 Ctrl+C，或者再次触发检测，直接忽略
             pass
@@ -140,20 +163,13 @@ def main(args: Args):
         logging.error(f"Runtime error?: {e}")
 
     finally:
+        infer_executor.shutdown(wait=False)
         # 安全归位逻辑
         if 'env' in locals():
             print("\n🛑 正在安全归位...")
             try:
-                # 简单归位：给一个全 0 的动作（或者你的归位逻辑）
-                # 注意：这里构造一个 (1, 7) 的动作，而不是 (7,)
-                target_state = np.zeros(7, dtype=np.float32)
-                # 如果你想保持夹爪状态，可以读取当前状态（略）
-                
-                # 缓慢归位循环
-                for _ in range(50):
-                   env.controller.apply_action(target_state)
-                   time.sleep(0.02)
-                   
+                # 归位指令发一次即可，controller 里会轮询到位才返回
+                env.controller.perform_home_sequence()
                 print("✅ 已归位。")
             except Exception as e:
                 print(f"归位失败: {e}")
@@ -1,8 +1,10 @@
+import os
 import time
 import logging
 import numpy as np
 import sys
 import select
+import threading
 import tty
 import termios
 from typing import Dict, Any, Optional
@@ -25,13 +27,23 @@ class MKController:
         self.driver = MKRobotStandalone(port=port, camera_indices=camera_indices)
         self.is_connected = False
         self.old_settings = termios.tcgetattr(sys.stdin)
+        # 按键检测放后台线程：控制循环里只看两个 Event 标志，
+        # 每个动作 tick 不再进 select 系统调用
+        self._pause_event = threading.Event()
+        self._quit_event = threading.Event()
+        self._kbd_thread = None
+        # 持久 poll 对象：fd 只注册一次，不像 select 每次调用都重建 fd_set
+        self._poll = select.poll()
+        self._poll.register(sys.stdin.fileno(), select.POLLIN)
 
     def connect(self):
         try:
             self.driver.connect()
             self.is_connected = True
             tty.setcbreak(sys.stdin.fileno())
-            
+            self._kbd_thread = threading.Thread(target=self._kbd_worker, daemon=True)
+            self._kbd_thread.start()
+
             print("\n========================================")
             print(" 🎮 控制器就绪")
             print(" [SPACE] : 暂停并归零 (再次按 SPACE 重置推理)")
@@ -46,36 +58,71 @@ class MKController:
     def restore_terminal(self):
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_settings)
 
-    def check_user_input(self):
-        if select.select([sys.stdin], [], [], 0)[0]:
-            key = sys.stdin.read(1)
+    def _kbd_worker(self):
+        """[后台线程] 阻塞在 select 上等按键，到了就置对应的 Event"""
+        fd = sys.stdin.fileno()
+        while self.is_connected:
+            # 带超时是为了 close() 之后线程能自己退出
+            if not self._poll.poll(500):
+                continue
+            try:
+                key = os.read(fd, 1).decode(errors="ignore")
+            except OSError:
+                break
             if key.lower() == 'q':
-                logger.info("用户请求退出")
-                self.close()
-                raise KeyboardInterrupt
+                self._quit_event.set()
             elif key == ' ':
-                # 1. 先暂停并归位
-                logger.warning("\n>>> ⏸️  已暂停! 正在归零... (再次按空格键 -> 重置推理) <<<")
-                self.perform_home_sequence()
-                
-                # 2. 死循环等待用户再次指令
-                while True:
-                    if select.select([sys.stdin], [], [], 0.1)[0]:
-                        k = sys.stdin.read(1)
-                        if k == ' ':
-                            print(">>> 🔄 检测到重置信号，正在重启推理... <<<")
-                            # 🌟 [关键] 这里不 break，而是直接抛出异常！
-                            # 这会像中断一样，直接炸断 env.apply_action 的循环
-                            raise RobotResetException()
-                        elif k.lower() == 'q':
-                            raise KeyboardInterrupt
+                self._pause_event.set()
+
+    def check_user_input(self):
+        # 热路径只看标志位，没有任何系统调用
+        if self._quit_event.is_set():
+            logger.info("用户请求退出")
+            self.close()
+            raise KeyboardInterrupt
+        if self._pause_event.is_set():
+            self._pause_event.clear()
+            # 1. 先暂停并归位
+            logger.warning("\n>>> ⏸️  已暂停! 正在归零... (再次按空格键 -> 重置推理) <<<")
+            self.perform_home_sequence()
+
+            # 2. 等待用户再次指令 (后台线程负责置位)
+            while True:
+                if self._quit_event.is_set():
+                    raise KeyboardInterrupt
+                if self._pause_event.wait(timeout=0.1):
+                    self._pause_event.clear()
+                    print(">>> 🔄 检测到重置信号，正在重启推理... <<<")
+                    # 🌟 [关键] 这里不 break，而是直接抛出异常！
+                    # 这会像中断一样，直接炸断 env.apply_action 的循环
+                    raise RobotResetException()
 
     def perform_home_sequence(self):
         logger.info("Executing Home Sequence...")
-        home_pos = np.zeros(7, dtype=np.float32)
-        for _ in range(40): # 稍微慢一点归位
-            self.driver.send_action(home_pos)
-            time.sleep(0.033)
+        state = self.driver.get_observation().get("state")
+        if state is not None:
+            # 从当前姿态插值到零位：整条 (40,7) 轨迹一次广播算完
+            # (目标是零位，curr*(1-alpha) 就是完整插值)，循环里只剩发送和等拍
+            curr = np.asarray(state[:7], dtype=np.float32)
+            alphas = np.linspace(0.0, 1.0, 40, dtype=np.float32)[:, None]
+            traj = curr * (1.0 - alphas)
+            period = 1.0 / 30.0
+            next_t = time.monotonic()
+            for waypoint in traj:
+                self.driver.send_action(waypoint)
+                next_t += period
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        else:
+            self.driver.send_action(np.zeros(7, dtype=np.float32))
+        # 收尾轮询真实关节角，到位立即返回；2 秒兜底
+        deadline = time.monotonic() + 2.0
+        while time.monotonic() < deadline:
+            state = self.driver.get_observation().get("state")
+            if state is not None and np.max(np.abs(state[:6])) < 0.02:
+                break
+            time.sleep(0.01)
         logger.info("Home Sequence Complete.")
 
     def get_observation(self) -> Dict[str, Any]:
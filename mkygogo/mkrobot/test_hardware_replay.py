@@ -1,4 +1,6 @@
 import time
+import queue
+import threading
 import numpy as np
 import tyro
 from dataclasses import dataclass
@@ -16,6 +18,47 @@ class Args:
 # J1-J3=3.0, J4=1.7, J5=0.4, J6=2.0, Gripper=1.0
 JOINT_NORM_SCALE = np.array([3.0, 3.0, 3.0, 1.7, 0.4, 2.0, 1.0], dtype=np.float32)
 
+
+class RateLimiter:
+    """
+    绝对截止时间的控频器：按 next += dt 排下一拍，某帧慢了下一帧就
+    少睡，长期平均严格贴住目标频率，不像 sleep(dt-elapsed) 会累积漂移
+    大段时间用 sleep 睡掉，最后 1ms 忙等收尾，拿到亚毫秒精度
+    """
+
+    def __init__(self, hz: float):
+        self.dt = 1.0 / hz
+        self.next = time.perf_counter() + self.dt
+
+    def sleep(self):
+        now = time.perf_counter()
+        # 已经超了一拍以上：跳帧重新对齐，并提示丢帧
+        if now - self.next > self.dt:
+            print(f"⚠️ RateLimiter: overrun {now - self.next:.3f}s, resyncing")
+            self.next = now + self.dt
+            return
+        rem = self.next - now
+        if rem > 2e-3:
+            time.sleep(rem - 1e-3)
+        while time.perf_counter() < self.next:
+            pass
+        self.next += self.dt
+
+def _diag_worker(q: queue.Queue):
+    """[后台线程] 格式化并打印诊断信息，控制环不付 stdio 的钱"""
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        frame_count, action_real, curr_state = item
+        diff = action_real[:6] - curr_state[:6]
+        mark = "  (!)" if np.any(np.abs(diff) > 0.1) else ""
+        print(f"\n--- Frame {frame_count} 诊断 ---")
+        print(f"目标(Real): {np.array2string(action_real[:6], precision=3)}")
+        print(f"实际(Obs) : {np.array2string(curr_state[:6], precision=3)}")
+        print(f"偏差      : {np.array2string(diff, precision=3)}{mark}")
+
+
 def safety_move_to_start(env, target_state):
     print("\n>>> [重要提示] 请手动协助机械臂归位 <<<")
     
@@ -31,6 +74,9 @@ def main(args: Args):
     loader = EpisodeActionLoader(args.dataset_root, args.episode_id)
     print(f"Loaded Episode {args.episode_id} with {len(loader)} frames.")
 
+    # 整个 Episode 的反归一化一次算完 (N,7)，回放循环里只做行索引
+    actions_real = np.multiply(loader.actions, JOINT_NORM_SCALE, dtype=np.float32)
+
     # 2. 初始化环境
     print("Initializing Robot Environment...")
     env = MKRobotOpenPIEnv(prompt="replay_test", port=args.robot_port)
@@ -48,42 +94,32 @@ def main(args: Args):
         
         input(">>> 确认安全后，按回车键开始 30Hz 原速回放...")
 
-        dt = 1.0 / args.control_hz
+        rate = RateLimiter(args.control_hz)
         frame_count = 0
-        
+        total_frames = len(loader)
+
+        # 诊断打印丢给后台线程，队列满了直接丢弃，控制环永不阻塞
+        diag_q = queue.Queue(maxsize=4)
+        threading.Thread(target=_diag_worker, args=(diag_q,), daemon=True).start()
+
         while True:
-            loop_start = time.time()
-            
             # 获取观测
             obs = env.get_observation()
-            
-            # A. 获取数据 (归一化的)
-            action_norm = loader.get_action()
-            if action_norm is None:
+
+            # A. 直接索引预先反归一化好的矩阵，循环里零计算零分配
+            if frame_count >= total_frames:
                 print("Episode finished.")
                 break
-            
-            # ==========================================================
-            # 🔑【核心修复】反归一化 (Un-normalize)
-            # Real_Pos = Norm_Pos * Scale
-            # ==========================================================
-            action_real = action_norm * JOINT_NORM_SCALE
-            # ==========================================================
-
-            # --- 🔍 诊断打印 (使用反归一化后的真实值) ---
+            action_real = actions_real[frame_count]
+
+            # --- 🔍 诊断 (热路径只做两个拷贝入队，格式化和打印在后台线程) ---
             if frame_count % 30 == 0 and obs is not None:
-                try:
-                    curr_state = obs.get("state")
-                    if curr_state is not None:
-                        print(f"\n--- Frame {frame_count} 诊断 ---")
-                        print(f"{'关节':<5} | {'目标(Real)':<10} | {'实际(Obs)':<10} | {'偏差':<8}")
-                        for j in range(6):
-                            t = action_real[j]
-                            c = curr_state[j]
-                            diff = t - c
-                            mark = "(!)" if abs(diff) > 0.1 else ""
-                            print(f"J{j+1:<5} | {t:<10.3f} | {c:<10.3f} | {diff:<8.3f} {mark}")
-                except: pass
+                curr_state = obs.get("state")
+                if curr_state is not None:
+                    try:
+                        diag_q.put_nowait((frame_count, action_real.copy(), np.copy(curr_state)))
+                    except queue.Full:
+                        pass
             # ----------------------------------------
 
             # B. 发送指令 (发送真实物理角度)
@@ -93,11 +129,8 @@ def main(args: Args):
             if frame_count % 30 == 0:
                 print(f"Replaying Frame {frame_count}/{len(loader)}", end='\r')
 
-            # C. 控频
-            elapsed = time.time() - loop_start
-            sleep_time = dt - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            # C. 控频 (绝对截止时间，不随单帧耗时漂移)
+            rate.sleep()
 
     except KeyboardInterrupt:
         print("\nStopped by user.")
@@ -109,15 +142,17 @@ def main(args: Args):
         try:
             obs = env.get_observation()
             if obs is not None and "state" in obs:
-                current = obs["state"]
+                current = np.asarray(obs["state"], dtype=np.float32)
                 target = np.zeros_like(current)
-                target[6] = current[6] 
-                
-                for i in range(100):
-                    alpha = (i + 1) / 100.0
-                    interp = current * (1 - alpha) + target * alpha
-                    env.apply_action({"actions": interp})
-                    time.sleep(0.02)
+                target[6] = current[6]
+
+                # 整条 (100,7) 插值轨迹一次广播算完，循环里只剩发送和等拍
+                alphas = np.linspace(1 / 100.0, 1.0, 100, dtype=np.float32)[:, None]
+                traj = current[None, :] * (1 - alphas) + target[None, :] * alphas
+                home_rate = RateLimiter(50.0)
+                for waypoint in traj:
+                    env.apply_action({"actions": waypoint})
+                    home_rate.sleep()
                 print("✅ 已归位。")
         except: pass
 
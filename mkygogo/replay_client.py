@@ -1,10 +1,12 @@
+import functools
 import pandas as pd
 import cv2
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 import logging
 import sys
+import threading
+import concurrent.futures
 
 try:
     from openpi_client import websocket_client_policy
@@ -22,6 +24,29 @@ PROMPT = "pick up the small cube and place it in the box"
 TARGET_SIZE = (224, 224) 
 # ===========================================
 
+# 每帧都一样的请求常量：掩码和占位图提到模块级，循环里只传引用
+# 掩码用原生 bool：msgpack 打包成 1 字节，不走 0-D ndarray 的 dict 编码
+_TRUE_MASK = True
+_FALSE_MASK = False
+_DUMMY_IMG = np.zeros((TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+_DUMMY_IMG.setflags(write=False)
+_IMAGE_MASK = {
+    "base_0_rgb": _TRUE_MASK,
+    "right_wrist_0_rgb": _TRUE_MASK,
+    "left_wrist_0_rgb": _FALSE_MASK
+}
+
+# 离线评测没有机器人在等，让 K 个请求同时挂在线上，
+# 总耗时从 N*RTT 变成约 N/K*RTT；每个 worker 线程一条独立连接
+INFLIGHT = 8
+_tls = threading.local()
+
+def _get_client():
+    if not hasattr(_tls, "client"):
+        _tls.client = websocket_client_policy.WebsocketClientPolicy(
+            host=SERVER_HOST, port=SERVER_PORT)
+    return _tls.client
+
 # 关节名称映射，方便看图
 JOINT_NAMES = [
     "Joint 1 (Base)", "Joint 2 (Shoulder)", "Joint 3 (Elbow)",
@@ -29,7 +54,9 @@ JOINT_NAMES = [
     "Joint 7 (Gripper)"
 ]
 
+@functools.lru_cache(maxsize=8)
 def load_episode_data(dataset_root, chunk_id, episode_id):
+    # 重复跑同一个 episode 时直接命中缓存，不再重新解析 parquet
     parquet_path = os.path.join(
         dataset_root, "data", f"chunk-{chunk_id:03d}", f"episode_{episode_id:06d}.parquet"
     )
@@ -47,6 +74,29 @@ def get_video_reader(dataset_root, camera_name, chunk_id, episode_id):
         raise FileNotFoundError(f"无法打开视频: {video_path}")
     return cap
 
+def preload_video(dataset_root, camera_name, chunk_id, episode_id, size):
+    """
+    一次性把整段视频解码成 (N, H, W, 3) RGB uint8 数组
+    FFmpeg 解码一口气跑完 (SIMD 吞吐拉满)，推理循环里只做行索引
+    """
+    cap = get_video_reader(dataset_root, camera_name, chunk_id, episode_id)
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    out = np.empty((max(n, 1), size[1], size[0], 3), dtype=np.uint8)
+    small = np.empty((size[1], size[0], 3), dtype=np.uint8)  # 复用的缩放中转
+    i = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if i >= len(out):  # 帧数元数据不准时兜底扩容
+            out = np.concatenate([out, np.empty_like(out)], axis=0)
+        # 先缩放再转色：BGR->RGB 只走 224x224 而不是整个原始帧
+        cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=out[i])
+        i += 1
+    cap.release()
+    return out[:i]
+
 def main():
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger("ReplaySmoothAll")
@@ -62,114 +112,114 @@ def main():
     # 加载数据
     logger.info(f"正在加载 Episode {EPISODE_ID}...")
     df = load_episode_data(DATASET_ROOT, CHUNK_ID, EPISODE_ID)
-    cap_top = get_video_reader(DATASET_ROOT, "top", CHUNK_ID, EPISODE_ID)
-    cap_wrist = get_video_reader(DATASET_ROOT, "wrist", CHUNK_ID, EPISODE_ID)
-    
+    # 列提前拍平成连续 numpy 矩阵，循环里不再每帧 df.iloc 造 Series
+    gt_actions = np.stack(df['action'].to_numpy()).astype(np.float32)
+    gt_states = np.stack(df['observation.state'].to_numpy()).astype(np.float32)
+    # 解码让 OpenCV 多线程放开跑，整段视频预解码成两个大数组
+    cv2.setNumThreads(os.cpu_count())
+    top_frames = preload_video(DATASET_ROOT, "top", CHUNK_ID, EPISODE_ID, TARGET_SIZE)
+    wrist_frames = preload_video(DATASET_ROOT, "wrist", CHUNK_ID, EPISODE_ID, TARGET_SIZE)
+
     total_frames = len(df)
     
     # === 🚀 平滑算法的核心数据结构 ===
     MAX_HORIZON = 100
     action_accumulator = np.zeros((total_frames + MAX_HORIZON, 7), dtype=np.float32)
-    count_accumulator = np.zeros((total_frames + MAX_HORIZON, 1), dtype=np.float32)
-    
-    naive_predictions = []
-    ground_truth_actions = []
+    count_accumulator = np.zeros(total_frames + MAX_HORIZON, dtype=np.float32)
 
     logger.info(f"开始推理并执行时间聚合 (共 {total_frames} 帧)...")
-    
-    dummy_img = np.zeros((TARGET_SIZE[0], TARGET_SIZE[1], 3), dtype=np.uint8)
-
-    for i in range(total_frames):
-        row = df.iloc[i]
-        ground_truth_actions.append(row['action'])
-
-        state = row['observation.state'] # <--- 这里读出来的就是真值
-        if i == 0:
-            state_arr = np.array(state)
-            print("\n" + "="*40)
-            print(f"🧐 [真相时刻] 数据集里的 State 形状: {state_arr.shape}")
-            print(f"🧐 [真相时刻] 数据内容: {state_arr}")
-            print("="*40 + "\n")
-
-        ret_t, frame_top = cap_top.read()
-        ret_w, frame_wrist = cap_wrist.read()
-        if not ret_t or not ret_w: break
-
-        img_top = cv2.resize(cv2.cvtColor(frame_top, cv2.COLOR_BGR2RGB), TARGET_SIZE)
-        img_wrist = cv2.resize(cv2.cvtColor(frame_wrist, cv2.COLOR_BGR2RGB), TARGET_SIZE)
 
+    usable_frames = min(total_frames, len(top_frames), len(wrist_frames))
+    # 朴素预测直接写进预分配矩阵；GT 就是列矩阵的切片视图，不 append 不拷贝
+    naive_array = np.empty((usable_frames, 7), dtype=np.float32)
+    gt_array = gt_actions[:usable_frames]
+    if usable_frames:
+        print("\n" + "="*40)
+        print(f"🧐 [真相时刻] 数据集里的 State 形状: {gt_states[0].shape}")
+        print(f"🧐 [真相时刻] 数据内容: {gt_states[0]}")
+        print("="*40 + "\n")
+
+    def infer_frame(i):
+        """worker 线程里发一帧请求；流水线有 K 帧在飞，字典逐帧新建"""
         request_data = {
             "image": {
-                "base_0_rgb": img_top,
-                "right_wrist_0_rgb": img_wrist,
-                "left_wrist_0_rgb": dummy_img
-            },
-            "image_mask": {
-                "base_0_rgb": np.array(True),
-                "right_wrist_0_rgb": np.array(True),
-                "left_wrist_0_rgb": np.array(False)
+                "base_0_rgb": top_frames[i],
+                "right_wrist_0_rgb": wrist_frames[i],
+                "left_wrist_0_rgb": _DUMMY_IMG
             },
-            "state": np.array(row['observation.state'], dtype=np.float32),
+            "image_mask": _IMAGE_MASK,
+            "state": gt_states[i],
             "prompt": PROMPT
         }
-
         try:
-            result = client.infer(request_data)
+            result = _get_client().infer(request_data)
             action_chunk = np.array(result['actions'])
             if action_chunk.ndim == 3: action_chunk = action_chunk[0]
         except:
             action_chunk = np.zeros((1, 7))
+        return action_chunk
 
-        # 1. 记录朴素预测 (第1帧)
-        naive_predictions.append(action_chunk[0])
-
-        # 2. 执行时间聚合
-        horizon = action_chunk.shape[0]
-        for t in range(horizon):
-            if i + t < len(action_accumulator):
-                action_accumulator[i + t] += action_chunk[t]
-                count_accumulator[i + t] += 1.0
+    # map 保序返回，聚合逻辑还是逐帧顺序跑，只是网络往返被 K 路并发藏掉
+    with concurrent.futures.ThreadPoolExecutor(max_workers=INFLIGHT) as pool:
+        for i, action_chunk in enumerate(pool.map(infer_frame, range(usable_frames))):
+            # 1. 记录朴素预测 (第1帧)
+            naive_array[i] = action_chunk[0]
 
-        if i % 50 == 0:
-            print(f"Processing frame {i}/{total_frames}...", end='\r')
+            # 2. 执行时间聚合 (整个 chunk 一次切片加进去，不再逐步循环)
+            end = min(i + action_chunk.shape[0], len(action_accumulator))
+            action_accumulator[i:end] += action_chunk[:end - i]
+            count_accumulator[i:end] += 1.0
 
-    cap_top.release()
-    cap_wrist.release()
+            if i % 50 == 0:
+                print(f"Processing frame {i}/{total_frames}...", end='\r')
 
-    # 计算最终平滑结果
+    # 计算最终平滑结果 (原地除，不另开一块结果数组)
     count_accumulator[count_accumulator == 0] = 1.0
-    smoothed_actions = action_accumulator[:total_frames] / count_accumulator[:total_frames]
-    
-    naive_array = np.array(naive_predictions)
-    gt_array = np.array(ground_truth_actions)
+    smoothed_actions = np.divide(
+        action_accumulator[:total_frames], count_accumulator[:total_frames, None],
+        out=action_accumulator[:total_frames])
 
     # === 绘图对比 (所有7个关节) ===
+    # matplotlib 到这里才导入：后端探测/字体缓存 (几百毫秒) 不拖慢启动，
+    # 推理阶段也不占它那份内存
+    import matplotlib
+    matplotlib.use("Agg")  # 纯离线出图，跳过交互后端探测
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
     logger.info("生成全关节对比图...")
     # 设置一个较高的画布，容纳7张图
     fig, axes = plt.subplots(7, 1, figsize=(15, 25), sharex=True)
-    
+
     colors = ['black', 'red', 'blue']
     labels = ['Ground Truth', 'Single Step (Naive)', 'Smoothed (Aggregation)']
     linestyles = ['-', ':', '-']
     alphas = [1.0, 0.7, 1.0]
+    linewidths = [2, 1.5, 2]
+
+    # 三条曲线打包进一个 LineCollection，每个子图 1 个 artist 而不是 3 条 Line2D
+    series = [gt_array, naive_array, smoothed_actions]
+    xs = [np.arange(len(s)) for s in series]
+    rgba = [matplotlib.colors.to_rgba(c, a) for c, a in zip(colors, alphas)]
 
     for j_idx in range(7):
         ax = axes[j_idx]
-        
-        # 1. Truth
-        ax.plot(gt_array[:, j_idx], color=colors[0], label=labels[0], linewidth=2)
-        # 2. Naive
-        ax.plot(naive_array[:, j_idx], color=colors[1], linestyle=linestyles[1], label=labels[1], alpha=alphas[1])
-        # 3. Smoothed
-        ax.plot(smoothed_actions[:, j_idx], color=colors[2], label=labels[2], linewidth=2)
-        
+
+        segs = [np.column_stack([xs[k], series[k][:, j_idx]]) for k in range(3)]
+        ax.add_collection(LineCollection(
+            segs, colors=rgba, linestyles=linestyles, linewidths=linewidths))
+        ax.autoscale()  # add_collection 不会自动更新坐标范围
+
         ax.set_title(f'{JOINT_NAMES[j_idx]} Comparison')
         ax.set_ylabel('Value')
         ax.grid(True)
-        
-        # 只在第一个子图显示图例，节省空间
+
+        # 只在第一个子图显示图例 (collection 没有逐线 label，用代理句柄)
         if j_idx == 0:
-            ax.legend(loc='upper right')
+            handles = [Line2D([0], [0], color=rgba[k], linestyle=linestyles[k],
+                              linewidth=linewidths[k], label=labels[k]) for k in range(3)]
+            ax.legend(handles=handles, loc='upper right')
 
     axes[-1].set_xlabel('Frame') # 只在最后一张图显示X轴标签
     
@@ -1,10 +1,13 @@
+import functools
 import pandas as pd
 import cv2
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 import logging
 import sys
+import threading
+import subprocess
+import concurrent.futures
 from tqdm import tqdm
 
 try:
@@ -24,7 +27,32 @@ TARGET_SIZE = (224, 224)
 OUTPUT_VIDEO = "replay_render.mp4"
 # ===========================================
 
+# 每帧都一样的请求常量：掩码和占位图提到模块级，循环里只传引用
+# 掩码用原生 bool：msgpack 打包成 1 字节，不走 0-D ndarray 的 dict 编码
+_TRUE_MASK = True
+_FALSE_MASK = False
+_DUMMY_IMG = np.zeros((TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+_DUMMY_IMG.setflags(write=False)
+_IMAGE_MASK = {
+    "base_0_rgb": _TRUE_MASK,
+    "right_wrist_0_rgb": _TRUE_MASK,
+    "left_wrist_0_rgb": _FALSE_MASK
+}
+
+# 离线评测没有机器人在等，让 K 个请求同时挂在线上，
+# 总耗时从 N*RTT 变成约 N/K*RTT；每个 worker 线程一条独立连接
+INFLIGHT = 8
+_tls = threading.local()
+
+def _get_client():
+    if not hasattr(_tls, "client"):
+        _tls.client = websocket_client_policy.WebsocketClientPolicy(
+            host=SERVER_HOST, port=SERVER_PORT)
+    return _tls.client
+
+@functools.lru_cache(maxsize=8)
 def load_episode_data(dataset_root, chunk_id, episode_id):
+    # 重复跑同一个 episode 时直接命中缓存，不再重新解析 parquet
     parquet_path = os.path.join(
         dataset_root, "data", f"chunk-{chunk_id:03d}", f"episode_{episode_id:06d}.parquet"
     )
@@ -42,20 +70,28 @@ def get_video_reader(dataset_root, camera_name, chunk_id, episode_id):
         raise FileNotFoundError(f"无法打开视频: {video_path}")
     return cap
 
-def draw_bar(img, x, y, w, h, val, min_v, max_v, color, label):
-    """ 在图像上绘制一个数值条 """
-    # 背景
-    cv2.rectangle(img, (x, y), (x + w, y + h), (50, 50, 50), -1)
-    # 归一化长度
-    norm_val = (val - min_v) / (max_v - min_v + 1e-6)
-    norm_val = np.clip(norm_val, 0, 1)
-    bar_w = int(w * norm_val)
-    # 进度
-    cv2.rectangle(img, (x, y), (x + bar_w, y + h), color, -1)
-    # 边框
-    cv2.rectangle(img, (x, y), (x + w, y + h), (200, 200, 200), 1)
-    # 文字
-    cv2.putText(img, f"{label}: {val:.3f}", (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+def preload_video(dataset_root, camera_name, chunk_id, episode_id, size):
+    """
+    一次性把整段视频解码成 (N, H, W, 3) RGB uint8 数组
+    解码只跑一遍，推理和渲染两个阶段都直接索引，不用二次开视频
+    """
+    cap = get_video_reader(dataset_root, camera_name, chunk_id, episode_id)
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    out = np.empty((max(n, 1), size[1], size[0], 3), dtype=np.uint8)
+    small = np.empty((size[1], size[0], 3), dtype=np.uint8)  # 复用的缩放中转
+    i = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if i >= len(out):  # 帧数元数据不准时兜底扩容
+            out = np.concatenate([out, np.empty_like(out)], axis=0)
+        # 先缩放再转色：BGR->RGB 只走 224x224 而不是整个原始帧
+        cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=out[i])
+        i += 1
+    cap.release()
+    return out[:i]
 
 def main():
     logging.basicConfig(level=logging.INFO)
@@ -73,133 +109,137 @@ def main():
     logger.info(f"加载数据 Episode {EPISODE_ID}...")
     df = load_episode_data(DATASET_ROOT, CHUNK_ID, EPISODE_ID)
     total_frames = len(df)
+    # 列提前拍平成连续 numpy 矩阵，循环里不再每帧 df.iloc 造 Series
+    gt_actions = np.stack(df['action'].to_numpy()).astype(np.float32)
+    gt_states = np.stack(df['observation.state'].to_numpy()).astype(np.float32)
     
     # 3. 准备平滑计算
     MAX_HORIZON = 100
     action_accumulator = np.zeros((total_frames + MAX_HORIZON, 7), dtype=np.float32)
-    count_accumulator = np.zeros((total_frames + MAX_HORIZON, 1), dtype=np.float32)
-    
-    naive_predictions = []
-    ground_truth_actions = []
+    count_accumulator = np.zeros(total_frames + MAX_HORIZON, dtype=np.float32)
 
-    cap_top = get_video_reader(DATASET_ROOT, "top", CHUNK_ID, EPISODE_ID)
-    cap_wrist = get_video_reader(DATASET_ROOT, "wrist", CHUNK_ID, EPISODE_ID)
-    dummy_img = np.zeros((TARGET_SIZE[0], TARGET_SIZE[1], 3), dtype=np.uint8)
+    # 整段视频预解码成两个大数组，后面两个阶段共用，不再二次开视频
+    cv2.setNumThreads(os.cpu_count())
+    top_frames = preload_video(DATASET_ROOT, "top", CHUNK_ID, EPISODE_ID, TARGET_SIZE)
+    wrist_frames = preload_video(DATASET_ROOT, "wrist", CHUNK_ID, EPISODE_ID, TARGET_SIZE)
 
     logger.info(">>> 阶段1/2: 正在推理并计算平滑轨迹...")
-    
-    for i in tqdm(range(total_frames)):
-        row = df.iloc[i]
-        ground_truth_actions.append(row['action'])
-        
-        ret_t, frame_top = cap_top.read()
-        ret_w, frame_wrist = cap_wrist.read()
-        if not ret_t or not ret_w: break
 
-        img_top = cv2.resize(cv2.cvtColor(frame_top, cv2.COLOR_BGR2RGB), TARGET_SIZE)
-        img_wrist = cv2.resize(cv2.cvtColor(frame_wrist, cv2.COLOR_BGR2RGB), TARGET_SIZE)
+    usable_frames = min(total_frames, len(top_frames), len(wrist_frames))
+    # 朴素预测直接写进预分配矩阵；GT 就是列矩阵的切片视图，不 append 不拷贝
+    naive_array = np.empty((usable_frames, 7), dtype=np.float32)
+    gt_array = gt_actions[:usable_frames]
 
+    def infer_frame(i):
+        """worker 线程里组请求+发一帧；流水线有 K 帧在飞，字典逐帧新建，
+        里面塞的全是预解码帧和模块级常量引用"""
         request_data = {
             "image": {
-                "base_0_rgb": img_top,
-                "right_wrist_0_rgb": img_wrist,
-                "left_wrist_0_rgb": dummy_img
+                "base_0_rgb": top_frames[i],
+                "right_wrist_0_rgb": wrist_frames[i],
+                "left_wrist_0_rgb": _DUMMY_IMG
             },
-            "image_mask": {
-                "base_0_rgb": np.array(True),
-                "right_wrist_0_rgb": np.array(True),
-                "left_wrist_0_rgb": np.array(False)
-            },
-            "state": np.array(row['observation.state'], dtype=np.float32),
+            "image_mask": _IMAGE_MASK,
+            "state": gt_states[i],
             "prompt": PROMPT
         }
-
         try:
-            result = client.infer(request_data)
+            result = _get_client().infer(request_data)
             action_chunk = np.array(result['actions'])
             if action_chunk.ndim == 3: action_chunk = action_chunk[0]
         except:
             action_chunk = np.zeros((1, 7))
+        return action_chunk
 
-        # 记录
-        naive_predictions.append(action_chunk[0])
+    # map 保序返回，聚合逻辑还是逐帧顺序跑，只是网络往返被 K 路并发藏掉
+    with concurrent.futures.ThreadPoolExecutor(max_workers=INFLIGHT) as pool:
+        results = pool.map(infer_frame, range(usable_frames))
+        for i, action_chunk in enumerate(tqdm(results, total=usable_frames)):
+            # 记录朴素预测 (第1帧)
+            naive_array[i] = action_chunk[0]
 
-        # 累加 (时间聚合)
-        horizon = action_chunk.shape[0]
-        for t in range(horizon):
-            if i + t < len(action_accumulator):
-                action_accumulator[i + t] += action_chunk[t]
-                count_accumulator[i + t] += 1.0
+            # 累加 (时间聚合)：整个 chunk 一次切片加进去，不再逐步循环
+            end = min(i + action_chunk.shape[0], len(action_accumulator))
+            action_accumulator[i:end] += action_chunk[:end - i]
+            count_accumulator[i:end] += 1.0
 
-    # 释放并重新打开（为了生成视频）
-    cap_top.release()
-    cap_wrist.release()
-
-    # 4. 计算最终平滑曲线
+    # 4. 计算最终平滑曲线 (原地除，不另开一块结果数组)
     count_accumulator[count_accumulator == 0] = 1.0
-    smoothed_actions = action_accumulator[:total_frames] / count_accumulator[:total_frames]
-    naive_array = np.array(naive_predictions)
-    gt_array = np.array(ground_truth_actions)
+    smoothed_actions = np.divide(
+        action_accumulator[:total_frames], count_accumulator[:total_frames, None],
+        out=action_accumulator[:total_frames])
 
     # 5. 生成视频
     logger.info(f">>> 阶段2/2: 正在渲染视频 {OUTPUT_VIDEO}...")
     
-    # 重新读取
-    cap_top = get_video_reader(DATASET_ROOT, "top", CHUNK_ID, EPISODE_ID)
-    cap_wrist = get_video_reader(DATASET_ROOT, "wrist", CHUNK_ID, EPISODE_ID)
-    
-    # 初始化 VideoWriter
-    # 画布大小: 左边Top(224) + 中间Wrist(224) + 右边数据板(300) = 748 宽
+    # 画布大小: 左边Top(224) + 中间Wrist(224) + 右边数据板(320) = 768 宽
     # 高度: 224
     canvas_w, canvas_h = 224 + 224 + 320, 224
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    writer = cv2.VideoWriter(OUTPUT_VIDEO, fourcc, 30.0, (canvas_w, canvas_h))
-
-    for i in tqdm(range(total_frames)):
-        ret_t, frame_top = cap_top.read()
-        ret_w, frame_wrist = cap_wrist.read()
-        if not ret_t or not ret_w: break
-        
-        # 画面
-        show_top = cv2.resize(frame_top, (224, 224))
-        show_wrist = cv2.resize(frame_wrist, (224, 224))
-        
-        # 数据板
-        panel = np.zeros((224, 320, 3), dtype=np.uint8)
-        
-        # 绘制数值对比 (以 Joint 1 和 Joint 4 为例)
+    render_frames = min(total_frames, len(top_frames), len(wrist_frames))
+
+    # 六条数值条: (值序列, 最小值, 最大值, 颜色, y 坐标, 标签)
+    # J1 范围假设 -3 到 3 (根据你的机器人调整)，J4 用 -1.7 到 1.2
+    bar_defs = [
+        (gt_array[:, 0],         -3.0, 3.0, (100, 100, 100),  50, "J1 GT (Gray)"),
+        (naive_array[:, 0],      -3.0, 3.0, (0, 0, 255),      80, "J1 Naive (Red)"),
+        (smoothed_actions[:, 0], -3.0, 3.0, (255, 100, 0),   110, "J1 Smooth (Blue)"),
+        (gt_array[:, 3],         -1.7, 1.2, (100, 100, 100), 150, "J4 GT (Gray)"),
+        (naive_array[:, 3],      -1.7, 1.2, (0, 0, 255),     180, "J4 Naive (Red)"),
+        (smoothed_actions[:, 3], -1.7, 1.2, (255, 100, 0),   210, "J4 Smooth (Blue)"),
+    ]
+
+    # 所有帧的条长一次向量化算完 (N,6)；背景/边框/标签与帧无关，画进模板
+    bar_widths = np.empty((render_frames, 6), dtype=np.int32)
+    panel_template = np.zeros((canvas_h, 320, 3), dtype=np.uint8)
+    for k, (vals, min_v, max_v, color, y, label) in enumerate(bar_defs):
+        norm = np.clip((vals[:render_frames] - min_v) / (max_v - min_v + 1e-6), 0, 1)
+        bar_widths[:, k] = (norm * 280).astype(np.int32)
+        cv2.rectangle(panel_template, (10, y), (290, y + 15), (50, 50, 50), -1)
+        cv2.rectangle(panel_template, (10, y), (290, y + 15), (200, 200, 200), 1)
+        cv2.putText(panel_template, label, (10, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+    # 优先把裸帧喂给 ffmpeg 管道 (编码在子进程里并行跑)；没装 ffmpeg 就退回 VideoWriter
+    writer = None
+    proc = None
+    try:
+        proc = subprocess.Popen(
+            ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo',
+             '-pix_fmt', 'bgr24', '-s', f'{canvas_w}x{canvas_h}', '-r', '30',
+             '-i', '-', '-c:v', 'libx264', '-preset', 'ultrafast',
+             '-pix_fmt', 'yuv420p', OUTPUT_VIDEO],
+            stdin=subprocess.PIPE)
+    except FileNotFoundError:
+        logger.warning("找不到 ffmpeg，退回 cv2.VideoWriter 同步编码")
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        writer = cv2.VideoWriter(OUTPUT_VIDEO, fourcc, 30.0, (canvas_w, canvas_h))
+
+    # 画布和数据板各一块复用缓冲；通道倒序切片就是 RGB->BGR
+    canvas = np.empty((canvas_h, canvas_w, 3), dtype=np.uint8)
+    panel = np.empty_like(panel_template)
+
+    for i in tqdm(range(render_frames)):
+        canvas[:, :224] = top_frames[i][:, :, ::-1]
+        canvas[:, 224:448] = wrist_frames[i][:, :, ::-1]
+
+        # 数据板 = 模板 + 帧号 + 六条动态进度条
+        np.copyto(panel, panel_template)
         cv2.putText(panel, f"Frame: {i:03d}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-        
-        # Joint 1
-        j1_gt = gt_array[i][0]
-        j1_naive = naive_array[i][0]
-        j1_smooth = smoothed_actions[i][0]
-        
-        # 范围假设 (根据你的机器人调整，这里假设 -3 到 3)
-        min_v, max_v = -3.0, 3.0 
-        
-        y_off = 50
-        draw_bar(panel, 10, y_off, 280, 15, j1_gt, min_v, max_v, (100, 100, 100), "J1 GT (Gray)")
-        draw_bar(panel, 10, y_off+30, 280, 15, j1_naive, min_v, max_v, (0, 0, 255), "J1 Naive (Red)")
-        draw_bar(panel, 10, y_off+60, 280, 15, j1_smooth, min_v, max_v, (255, 100, 0), "J1 Smooth (Blue)")
-        
-        # Joint 4 (Wrist)
-        j4_gt = gt_array[i][3]
-        j4_naive = naive_array[i][3]
-        j4_smooth = smoothed_actions[i][3]
-        
-        y_off = 150
-        draw_bar(panel, 10, y_off, 280, 15, j4_gt, -1.7, 1.2, (100, 100, 100), "J4 GT (Gray)")
-        draw_bar(panel, 10, y_off+30, 280, 15, j4_naive, -1.7, 1.2, (0, 0, 255), "J4 Naive (Red)")
-        draw_bar(panel, 10, y_off+60, 280, 15, j4_smooth, -1.7, 1.2, (255, 100, 0), "J4 Smooth (Blue)")
-
-        # 拼合
-        row = np.hstack([show_top, show_wrist, panel])
-        writer.write(row)
-
-    writer.release()
-    cap_top.release()
-    cap_wrist.release()
+        for k, (vals, min_v, max_v, color, y, label) in enumerate(bar_defs):
+            w = int(bar_widths[i, k])
+            if w > 0:
+                cv2.rectangle(panel, (10, y), (10 + w, y + 15), color, -1)
+        canvas[:, 448:] = panel
+
+        if proc is not None:
+            proc.stdin.write(canvas.tobytes())
+        else:
+            writer.write(canvas)
+
+    if proc is not None:
+        proc.stdin.close()
+        proc.wait()
+    else:
+        writer.release()
     logger.info(f"视频渲染完成! 已保存至 {OUTPUT_VIDEO}")
 
 if __name__ == "__main__":
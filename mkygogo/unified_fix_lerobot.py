@@ -1,10 +1,24 @@
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pads
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 import json
+try:
+    import orjson
+except ImportError:
+    # 没装 orjson 就用标准库垫一个同名接口 (dumps 要吐 bytes)
+    class orjson:
+        @staticmethod
+        def dumps(obj):
+            return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 import pathlib
 import subprocess
 import shutil
 import cv2
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 # ================= 配置区 =================
@@ -15,15 +29,65 @@ EXTERNAL_BACKUP_PATH = pathlib.Path("/home/jr/PI/data_backups/mkrobot_raw_data")
 # 3. 任务指令
 CORRECT_TASK = "pick up the small cube and place it in the box"
 FPS = 30
+# x264 预设可用环境变量覆盖 (X264_PRESET=veryfast/faster/fast...)
+X264_PRESET = os.environ.get("X264_PRESET", "faster")
 # =========================================
 
 def run_cmd(cmd):
     return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
+def move_fast(src, dst):
+    """同一文件系统上 os.rename 只改目录项 (微秒级)；
+    跨设备会抛 OSError(EXDEV)，这时才退回 shutil.move 的拷贝+删除"""
+    try:
+        os.rename(src, dst)
+    except OSError:
+        shutil.move(str(src), str(dst))
+
+def segment_source(src, seg_dir, cut_frames):
+    """一趟解码+编码直接把源视频按帧号切成多段 (seg_%06d.mp4)：
+    segment muxer 在切点处分文件，省掉先重排关键帧再逐段裁剪的第二遍 I/O"""
+    expr = "+".join(f"eq(n,{f})" for f in cut_frames)
+    result = run_cmd([
+        'ffmpeg', '-y', '-i', str(src),
+        '-force_key_frames', f"expr:{expr}",  # 切点处必须是关键帧，段才能独立解码
+        '-c:v', 'libx264', '-preset', X264_PRESET, '-crf', '18',
+        '-g', '9999', '-x264-params', 'scenecut=0',  # 只在指定点切 GOP
+        '-tune', 'fastdecode',  # 关 CABAC/8x8dct，训练 data-loader 解码更省
+        '-pix_fmt', 'yuv420p',
+        '-f', 'segment', '-segment_frames', ",".join(str(f) for f in cut_frames),
+        '-reset_timestamps', '1',
+        '-segment_format_options', 'movflags=+faststart',
+        str(seg_dir / "seg_%06d.mp4")
+    ])
+    return result.returncode == 0
+
+_frame_count_cache = {}
+
 def get_video_frame_count(video_path):
-    cap = cv2.VideoCapture(str(video_path))
-    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    cap.release()
+    """ffprobe 只读容器头里的 nb_frames，不初始化解码器；
+    VFR 文件拿不到就 -count_packets 数包，ffprobe 不可用再退回 OpenCV"""
+    key = str(video_path)
+    if key in _frame_count_cache:
+        return _frame_count_cache[key]
+    try:
+        out = subprocess.check_output([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=nb_frames',
+            '-of', 'default=nokey=1:noprint_wrappers=1', key])
+        text = out.decode().strip()
+        if not text or text == 'N/A':
+            out = subprocess.check_output([
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+                '-show_entries', 'stream=nb_read_packets',
+                '-of', 'default=nokey=1:noprint_wrappers=1', key])
+            text = out.decode().strip()
+        count = int(text)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        cap = cv2.VideoCapture(key)
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+    _frame_count_cache[key] = count
     return count
 
 def main():
@@ -40,7 +104,7 @@ def main():
     # 1. 搬离原始 Parquet 聚合文件到外部（如果还在 data 目录下）
     for f in data_dir.glob("file-*.parquet"):
         print(f"📦 搬运原始数据: {f.name}")
-        shutil.move(str(f), str(EXTERNAL_BACKUP_PATH / f.name))
+        move_fast(f, EXTERNAL_BACKUP_PATH / f.name)
         
     # 2. 搬离之前的 raw_backup 目录到外部（防止递归扫描导致数据翻倍）
     old_backup = DATASET_PATH / "data" / "raw_backup"
@@ -48,7 +112,7 @@ def main():
         staging_backup = EXTERNAL_BACKUP_PATH / "raw_backup"
         if not staging_backup.exists():
             print(f"📦 搬运备份目录: {old_backup.name}")
-            shutil.move(str(old_backup), str(staging_backup))
+            move_fast(old_backup, staging_backup)
         else:
             print(f"🗑️ 删除重复备份目录: {old_backup}")
             shutil.rmtree(old_backup)
@@ -76,25 +140,37 @@ def main():
         print(f"❌ 错误：在 {EXTERNAL_BACKUP_PATH} 下没找到原始文件！")
         return
         
-    full_df = pd.concat([pd.read_parquet(f) for f in raw_files], ignore_index=True)
-    
-    # 清理 data 目录下旧的 episode 文件
-    for f in data_dir.glob("episode_*.parquet"): f.unlink()
+    # pyarrow dataset 惰性扫描原始文件：过滤下推按 episode 取数据，
+    # 峰值内存只有一个 episode，不再把整个语料 concat 进 pandas；
+    # mmap 文件系统让读盘走内核页缓存，不在堆上再复制一份列数据
+    dataset = pads.dataset([str(f) for f in raw_files], format="parquet",
+                           filesystem=pafs.LocalFileSystem(use_mmap=True))
+    episodes = sorted(pc.unique(
+        dataset.to_table(columns=["episode_index"]).column("episode_index")).to_pylist())
+
+    # 清理 data 目录下旧的 episode 文件 (scandir 一次列目录，不走 glob 的模式匹配)
+    with os.scandir(data_dir) as it:
+        for e in it:
+            if e.name.startswith("episode_") and e.name.endswith(".parquet"):
+                os.unlink(e.path)
 
-    episodes = sorted(full_df["episode_index"].unique())
     time_step = 1.0 / FPS
     ep_info_list = []
-    
+
     for ep_idx in tqdm(episodes, desc="处理 Parquet"):
-        ep_df = full_df[full_df["episode_index"] == ep_idx].copy().sort_values("index")
-        orig_start_idx = ep_df["index"].min()
-        num_frames = len(ep_df)
-        
-        ep_df["index"] = range(num_frames)
-        ep_df["timestamp"] = [float(i * time_step) for i in range(num_frames)]
-        
+        tbl = dataset.to_table(filter=pads.field("episode_index") == ep_idx)
+        tbl = tbl.sort_by("index")
+        orig_start_idx = int(tbl.column("index")[0].as_py())
+        num_frames = tbl.num_rows
+
+        # index/timestamp 整列替换，全程不落 pandas
+        tbl = tbl.set_column(tbl.schema.get_field_index("index"), "index",
+                             pa.array(np.arange(num_frames, dtype=np.int64)))
+        tbl = tbl.set_column(tbl.schema.get_field_index("timestamp"), "timestamp",
+                             pa.array(np.arange(num_frames, dtype=np.float64) * time_step))
+
         out_path = data_dir / f"episode_{int(ep_idx):06d}.parquet"
-        ep_df.to_parquet(out_path, index=False)
+        pq.write_table(tbl, out_path, compression="zstd")
         ep_info_list.append({"index": int(ep_idx), "length": num_frames, "orig_start": orig_start_idx})
 
     # --- STEP 2: 物理裁剪视频并重置 PTS ---
@@ -112,44 +188,83 @@ def main():
             video_map.append({"path": v, "start": offset, "end": offset + cnt - 1})
             offset += cnt
 
-        for ep in tqdm(ep_info_list, desc=f"裁剪 {cam}"):
-            source = next((v for v in video_map if v["start"] <= ep["orig_start"] <= v["end"]), None)
-            if not source: continue
-            
-            local_start = ep["orig_start"] - source["start"]
-            local_end = local_start + ep["length"] - 1
-            out_video = cam_dir / f"episode_{ep['index']:06d}.mp4"
-            
-            cmd = [
-                'ffmpeg', '-y', '-i', str(source["path"]),
-                '-vf', f"select='between(n,{local_start},{local_end})',setpts=PTS-STARTPTS",
-                '-vsync', '0', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
-                str(out_video)
-            ]
-            run_cmd(cmd)
-            
+        # 每个源文件一趟 segment 切完所有 episode (1 次解码代替 N 次)；
+        # 段序号要和 episode 对得上，前提是各 episode 首尾相接铺满文件开头
+        for v in video_map:
+            eps = sorted((ep for ep in ep_info_list
+                          if v["start"] <= ep["orig_start"] <= v["end"]),
+                         key=lambda e: e["orig_start"])
+            v["eps"] = eps
+            v["segmented"] = False
+            contiguous = bool(eps) and eps[0]["orig_start"] == v["start"] and all(
+                eps[k]["orig_start"] == eps[k - 1]["orig_start"] + eps[k - 1]["length"]
+                for k in range(1, len(eps)))
+            if not contiguous:
+                print(f"⚠️ {v['path'].name} 内 episode 不连续，回退逐段转码")
+                continue
+
+            # 切点 = 每个 episode 的结束帧；尾部若有残余会多出一段，切完删掉
+            cut_frames = [ep["orig_start"] - v["start"] + ep["length"] for ep in eps]
+            if segment_source(v["path"], cam_dir, cut_frames):
+                segs = sorted(cam_dir.glob("seg_*.mp4"))
+                if len(segs) >= len(eps):
+                    for k, ep in enumerate(eps):
+                        segs[k].rename(cam_dir / f"episode_{ep['index']:06d}.mp4")
+                    for leftover in segs[len(eps):]:
+                        leftover.unlink()
+                    v["segmented"] = True
+                else:
+                    for s in segs: s.unlink()
+            if not v["segmented"]:
+                print(f"⚠️ 单趟分段失败: {v['path'].name}，该文件回退逐段转码")
+
+        # 兜底：没能一趟切完的源文件按 episode 逐段转码，
+        # 命令攒起来丢线程池并发跑 (每路限 4 线程、cpu//4 个 worker)
+        cmds = []
+        for source in video_map:
+            if source["segmented"]: continue
+            for ep in source["eps"]:
+                local_start = ep["orig_start"] - source["start"]
+                local_end = local_start + ep["length"] - 1
+                out_video = cam_dir / f"episode_{ep['index']:06d}.mp4"
+                cmds.append([
+                    'ffmpeg', '-y', '-i', str(source["path"]),
+                    '-vf', f"select='between(n,{local_start},{local_end})',setpts=PTS-STARTPTS",
+                    '-vsync', '0', '-c:v', 'libx264', '-preset', X264_PRESET, '-crf', '18',
+                    '-tune', 'fastdecode',
+                    '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-threads', '4',
+                    str(out_video)
+                ])
+
+        with ThreadPoolExecutor(max_workers=max(1, os.cpu_count() // 4)) as ex:
+            futs = [ex.submit(run_cmd, c) for c in cmds]
+            for _ in tqdm(as_completed(futs), total=len(futs), desc=f"裁剪 {cam}"):
+                pass
+
         # 裁剪完成后，将原始视频大文件搬离，防止干扰索引
         for v in raw_videos:
             dest = EXTERNAL_BACKUP_PATH / v.name
             if not dest.exists():
                 print(f"📦 搬离视频原件: {v.name}")
-                shutil.move(str(v), str(dest))
+                move_fast(v, dest)
             else:
                 v.unlink()
 
     # --- STEP 3: 补全元数据 ---
     print("\nStep 3: 强制刷新元数据 (补全 stats/length/task)...")
     
-    with open(meta_dir / "tasks.jsonl", "w", encoding="utf-8") as f:
-        f.write(json.dumps({"task_index": 0, "task": CORRECT_TASK}) + "\n")
-    
-    with open(meta_dir / "episodes.jsonl", "w", encoding="utf-8") as f:
-        for ep in ep_info_list:
-            f.write(json.dumps({"episode_index": ep["index"], "tasks": [CORRECT_TASK], "length": ep["length"]}) + "\n")
-            
-    with open(meta_dir / "episodes_stats.jsonl", "w", encoding="utf-8") as f:
-        for ep in ep_info_list:
-            f.write(json.dumps({"episode_index": ep["index"], "stats": {}}) + "\n")
+    # orjson 序列化 + 整块 write_bytes：每个文件一次系统调用写完
+    (meta_dir / "tasks.jsonl").write_bytes(
+        orjson.dumps({"task_index": 0, "task": CORRECT_TASK}) + b"\n")
+
+    # episodes 和 stats 共用一趟遍历攒进两个缓冲，各自一次 write 落盘
+    ep_buf, stat_buf = [], []
+    for ep in ep_info_list:
+        ep_buf.append(orjson.dumps(
+            {"episode_index": ep["index"], "tasks": [CORRECT_TASK], "length": ep["length"]}) + b"\n")
+        stat_buf.append(orjson.dumps({"episode_index": ep["index"], "stats": {}}) + b"\n")
+    (meta_dir / "episodes.jsonl").write_bytes(b"".join(ep_buf))
+    (meta_dir / "episodes_stats.jsonl").write_bytes(b"".join(stat_buf))
 
     info_path = meta_dir / "info.json"
     with open(info_path, "r") as f:
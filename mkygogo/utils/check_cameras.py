@@ -1,33 +1,37 @@
+import math
 import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+def _probe_camera(i):
+    """尝试打开单个索引并读一帧确认真的可用；失败返回 None
+    放在线程里跑：探测纯粹是等驱动 I/O，不占 GIL"""
+    # 注意：在Windows上，使用 cv2.CAP_DSHOW 可能会让初始化更快，
+    # 如果你发现扫描非常慢，可以将下一行改为: cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
+    cap = cv2.VideoCapture(i)
+
+    if cap.isOpened():
+        # 尝试读取一帧以确保设备真的可用
+        ret, frame = cap.read()
+        if ret:
+            print(f"[成功] 发现摄像头 ID: {i}")
+            return (i, cap)
+        print(f"[警告] 摄像头 ID {i} 无法读取画面，已释放。")
+    cap.release()
+    return None
 
 def check_and_open_cameras(max_checks=10):
     """
     检查可用摄像头并同时打开所有可用设备的画面
     max_checks: 最大尝试的索引范围 (默认检查 0-9)
     """
-    valid_caps = [] # 存储可用的 (索引, cap对象)
-
     print(f"正在扫描摄像头 (索引范围 0 - {max_checks-1})...")
 
-    # --- 第一步：扫描并打开所有可用设备 ---
-    for i in range(max_checks):
-        # 尝试打开摄像头
-        # 注意：在Windows上，使用 cv2.CAP_DSHOW 可能会让初始化更快，
-        # 如果你发现扫描非常慢，可以将下一行改为: cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
-        cap = cv2.VideoCapture(i)
-        
-        if cap.isOpened():
-            # 尝试读取一帧以确保设备真的可用
-            ret, frame = cap.read()
-            if ret:
-                print(f"[成功] 发现摄像头 ID: {i}")
-                valid_caps.append((i, cap))
-            else:
-                print(f"[警告] 摄像头 ID {i} 无法读取画面，已释放。")
-                cap.release()
-        else:
-            # 这里的 print 可以注释掉，以免输出太多干扰信息
-            pass 
+    # --- 第一步：并发扫描所有索引 ---
+    # 不存在的设备 V4L2 打开要干等超时 (可达秒级)，串行扫就是 N 倍超时；
+    # 全部索引同时探，总耗时约等于最慢的那一个
+    with ThreadPoolExecutor(max_workers=max_checks) as ex:
+        valid_caps = [r for r in ex.map(_probe_camera, range(max_checks)) if r]
 
     # 如果没有找到摄像头
     if not valid_caps:
@@ -36,21 +40,29 @@ def check_and_open_cameras(max_checks=10):
 
     print(f"\n共找到 {len(valid_caps)} 个可用设备。按 'q' 键退出程序。\n")
 
-    # --- 第二步：循环显示所有画面 ---
+    # --- 第二步：所有画面拼成一张马赛克，单窗口显示 ---
+    # N 个 imshow 窗口就是每轮 N 次独立的 GUI 画面上传；
+    # 拼进一块复用画布后每轮只 imshow 一次，缩放也只做一次
+    tile_w, tile_h = 320, 240
+    cols = math.ceil(math.sqrt(len(valid_caps)))
+    rows = math.ceil(len(valid_caps) / cols)
+    mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+
     try:
         while True:
-            for index, cap in valid_caps:
+            for k, (index, cap) in enumerate(valid_caps):
                 ret, frame = cap.read()
-                
+
                 if ret:
-                    # 在画面上标记 ID，方便区分
-                    text = f"Device ID: {index}"
-                    cv2.putText(frame, text, (10, 30), 
+                    r, c = divmod(k, cols)
+                    mosaic[r*tile_h:(r+1)*tile_h, c*tile_w:(c+1)*tile_w] = \
+                        cv2.resize(frame, (tile_w, tile_h))
+                    # 在对应格子上标记 ID，方便区分
+                    cv2.putText(mosaic, f"Device ID: {index}", (c*tile_w + 10, r*tile_h + 30),
                                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    
-                    # 显示窗口，窗口名为 "Cam <ID>"
-                    cv2.imshow(f'Cam {index}', frame)
-            
+
+            cv2.imshow('Cameras', mosaic)
+
             # 检测按键，按 'q' 退出
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
@@ -1,9 +1,19 @@
-import pandas as pd
-import json
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+try:
+    import orjson
+except ImportError:
+    import json
+
+    # 标准库兜底：json.loads 本来就接受 bytes，接口对得上
+    class orjson:
+        loads = staticmethod(json.loads)
+import subprocess
 import pathlib
 import cv2
 import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
 # ================= 配置区 =================
@@ -30,7 +40,22 @@ class ValidationReport:
 def get_video_info(video_path):
     if not video_path.exists():
         return False, 0, "File not found"
-    
+
+    # ffprobe 一条命令读完容器头里的全部流信息，不初始化解码器
+    # (OpenCV 开解码器每次 50-200ms，两路视频 x N 集攒起来很可观)
+    try:
+        out = subprocess.check_output([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-print_format', 'json', '-show_streams', str(video_path)])
+        stream = orjson.loads(out)["streams"][0]
+        num, den = stream.get("avg_frame_rate", "0/1").split("/")
+        fps = float(num) / float(den) if float(den) else 0.0
+        frame_count = int(stream["nb_frames"])
+        return True, frame_count, {"fps": fps, "res": (int(stream["width"]), int(stream["height"]))}
+    except (subprocess.CalledProcessError, FileNotFoundError,
+            KeyError, IndexError, ValueError):
+        pass  # 没装 ffprobe 或 VFR 没有 nb_frames，退回 OpenCV
+
     try:
         cap = cv2.VideoCapture(str(video_path))
         if not cap.isOpened():
@@ -46,6 +71,83 @@ def get_video_info(video_path):
     except Exception as e:
         return False, 0, str(e)
 
+def _validate_one(ep_info):
+    """[子进程] 校验单个 episode (读 parquet + 探两路视频都是独立 I/O)
+    返回 (ep_idx, errors, warnings, is_valid)，由主进程汇总进报告"""
+    data_dir = DATASET_PATH / "data" / "chunk-000"
+    video_root = DATASET_PATH / "videos"
+    ep_idx = ep_info["episode_index"]
+    errors = []
+    warnings = []
+    is_valid = True
+
+    # --- A. 检查 Parquet ---
+    parquet_path = data_dir / f"episode_{ep_idx:06d}.parquet"
+    parquet_rows = 0
+
+    if not parquet_path.exists():
+        errors.append(f"缺少 Parquet 文件: {parquet_path.name}")
+        is_valid = False
+    else:
+        try:
+            # 只读要检查的两列，校验全走 Arrow 的 C++ 内核，
+            # 不再为了几个标量把整表转成 pandas (那才是内存大头)；
+            # mmap 读文件走页缓存，多个校验子进程之间还能共享缓存页
+            tbl = pq.read_table(parquet_path, columns=["index", "timestamp"],
+                                memory_map=True)
+            idx = tbl.column("index").combine_chunks()
+            parquet_rows = len(idx)
+
+            # 检查 Index 连续性 (错位切片两两比较)
+            if parquet_rows > 1 and not pc.all(
+                    pc.less_equal(idx.slice(0, parquet_rows - 1), idx.slice(1))).as_py():
+                errors.append("Parquet 'index' 列不是单调递增的")
+                is_valid = False
+            idx_min = pc.min(idx).as_py()
+            if idx_min != 0:
+                errors.append(f"Parquet 'index' 不从 0 开始 (Start: {idx_min})")
+                is_valid = False
+
+            # 检查 Timestamp 逻辑
+            expected_duration = (parquet_rows - 1) / FPS
+            last_ts = tbl.column("timestamp")[-1].as_py()
+            if abs(last_ts - expected_duration) > 0.1: # 允许0.1秒误差
+                warnings.append(f"时间戳可能未重置? Last TS: {last_ts:.2f}, Expected: {expected_duration:.2f}")
+
+        except Exception as e:
+            errors.append(f"Parquet 读取损坏: {e}")
+            is_valid = False
+
+    # --- B. 检查 Videos (Top & Wrist) ---
+    # 假设 info.json 里没写具体的 key，我们默认检查转换脚本里用到的 camera names
+    cameras = ["observation.images.top", "observation.images.wrist"]
+
+    for cam in cameras:
+        video_path = video_root / cam / "chunk-000" / f"episode_{ep_idx:06d}.mp4"
+        exists, v_frames, v_info = get_video_info(video_path)
+
+        if not exists:
+            errors.append(f"缺少视频 ({cam}): {video_path.name}")
+            is_valid = False
+            continue
+
+        # 检查 FPS 匹配
+        if abs(v_info['fps'] - FPS) > 1.0:
+            warnings.append(f"视频 FPS ({v_info['fps']}) 与设定 ({FPS}) 不符")
+
+        # --- C. 核心检查: 帧数同步 ---
+        # 只有当 Parquet 也读取成功时才对比
+        if parquet_rows > 0:
+            diff = abs(parquet_rows - v_frames)
+            if diff > FRAME_TOLERANCE:
+                errors.append(f"严重失步! {cam} -> Parquet行数: {parquet_rows}, 视频帧数: {v_frames} (Diff: {diff})")
+                is_valid = False
+            elif diff > 0:
+                # 警告但不标记为 Invalid (FFmpeg 常见误差)
+                warnings.append(f"轻微帧数差异 {cam} -> Parquet: {parquet_rows}, Video: {v_frames}")
+
+    return ep_idx, errors, warnings, is_valid
+
 def validate():
     print(f"🔍 开始检查数据集: {DATASET_PATH}")
     report = ValidationReport()
@@ -62,11 +164,10 @@ def validate():
             return
 
     # 2. 读取 Episodes 列表
-    episodes_meta = []
     try:
-        with open(meta_dir / "episodes.jsonl", "r") as f:
-            for line in f:
-                episodes_meta.append(json.loads(line))
+        # 整个文件一次读成 bytes 再切行，orjson 直接吃 bytes 解析
+        lines = (meta_dir / "episodes.jsonl").read_bytes().splitlines()
+        episodes_meta = [orjson.loads(l) for l in lines if l]
     except Exception as e:
         print(f"⛔ 读取 episodes.jsonl 失败: {e}")
         return
@@ -74,71 +175,16 @@ def validate():
     report.total_episodes = len(episodes_meta)
     print(f"📋 发现 {report.total_episodes} 个 Episode 元数据记录，开始逐个校验...")
 
-    # 3. 逐个 Episode 校验
-    for ep_info in tqdm(episodes_meta, desc="校验中"):
-        ep_idx = ep_info["episode_index"]
-        is_valid = True
-        
-        # --- A. 检查 Parquet ---
-        parquet_path = data_dir / f"episode_{ep_idx:06d}.parquet"
-        parquet_rows = 0
-        
-        if not parquet_path.exists():
-            report.error(ep_idx, f"缺少 Parquet 文件: {parquet_path.name}")
-            is_valid = False
-        else:
-            try:
-                df = pd.read_parquet(parquet_path)
-                parquet_rows = len(df)
-                
-                # 检查 Index 连续性
-                if not df["index"].is_monotonic_increasing:
-                    report.error(ep_idx, "Parquet 'index' 列不是单调递增的")
-                    is_valid = False
-                if df["index"].min() != 0:
-                    report.error(ep_idx, f"Parquet 'index' 不从 0 开始 (Start: {df['index'].min()})")
-                    is_valid = False
-                
-                # 检查 Timestamp 逻辑
-                expected_duration = (parquet_rows - 1) / FPS
-                last_ts = df["timestamp"].iloc[-1]
-                if abs(last_ts - expected_duration) > 0.1: # 允许0.1秒误差
-                    report.warning(ep_idx, f"时间戳可能未重置? Last TS: {last_ts:.2f}, Expected: {expected_duration:.2f}")
-
-            except Exception as e:
-                report.error(ep_idx, f"Parquet 读取损坏: {e}")
-                is_valid = False
-
-        # --- B. 检查 Videos (Top & Wrist) ---
-        # 假设 info.json 里没写具体的 key，我们默认检查转换脚本里用到的 camera names
-        cameras = ["observation.images.top", "observation.images.wrist"]
-        
-        for cam in cameras:
-            video_path = video_root / cam / "chunk-000" / f"episode_{ep_idx:06d}.mp4"
-            exists, v_frames, v_info = get_video_info(video_path)
-            
-            if not exists:
-                report.error(ep_idx, f"缺少视频 ({cam}): {video_path.name}")
-                is_valid = False
-                continue
-            
-            # 检查 FPS 匹配
-            if abs(v_info['fps'] - FPS) > 1.0:
-                report.warning(ep_idx, f"视频 FPS ({v_info['fps']}) 与设定 ({FPS}) 不符")
-            
-            # --- C. 核心检查: 帧数同步 ---
-            # 只有当 Parquet 也读取成功时才对比
-            if parquet_rows > 0:
-                diff = abs(parquet_rows - v_frames)
-                if diff > FRAME_TOLERANCE:
-                    report.error(ep_idx, f"严重失步! {cam} -> Parquet行数: {parquet_rows}, 视频帧数: {v_frames} (Diff: {diff})")
-                    is_valid = False
-                elif diff > 0:
-                    # 警告但不标记为 Invalid (FFmpeg 常见误差)
-                    report.warning(ep_idx, f"轻微帧数差异 {cam} -> Parquet: {parquet_rows}, Video: {v_frames}")
-
-        if is_valid:
-            report.valid_episodes += 1
+    # 3. 逐个 Episode 校验 (子进程并行，主进程只汇总结果)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = pool.map(_validate_one, episodes_meta, chunksize=8)
+        for ep_idx, errors, warnings, is_valid in tqdm(results, total=len(episodes_meta), desc="校验中"):
+            for msg in errors:
+                report.error(ep_idx, msg)
+            for msg in warnings:
+                report.warning(ep_idx, msg)
+            if is_valid:
+                report.valid_episodes += 1
 
     # ================= 打印报告 =================
     print("\n" + "="*40)
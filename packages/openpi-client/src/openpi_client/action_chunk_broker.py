@@ -1,3 +1,4 @@
+import logging
 from typing import Dict
 
 import numpy as np
@@ -6,6 +7,8 @@ from typing_extensions import override
 
 from openpi_client import base_policy as _base_policy
 
+_log = logging.getLogger(__name__)
+
 
 class ActionChunkBroker(_base_policy.BasePolicy):
     """Wraps a policy to return action chunks one-at-a-time.
@@ -22,6 +25,8 @@ class ActionChunkBroker(_base_policy.BasePolicy):
         self._cur_step: int = 0
 
         self._last_results: Dict[str, np.ndarray] | None = None
+        # 新 chunk 到手时一次切好的逐帧结果 (见 infer)，热路径只查下标
+        self._frames: list | None = None
 
     # @override
     # def infer(self, obs: Dict) -> Dict:  # noqa: UP006
@@ -80,14 +85,12 @@ class ActionChunkBroker(_base_policy.BasePolicy):
 
     @override
     def infer(self, obs: Dict) -> Dict:  # noqa: UP006
-        # === 🔍 [DEBUG] 检查是联网还是吃缓存 ===
+        # 联网/吃缓存的跟踪信息走 logging：默认级别下只剩一次整数比较，
+        # 控制环不再周期性地停在 stdout flush 上；要看就开 DEBUG
         if self._last_results is None:
-            print(f"🌐 [Broker] 正在联网获取新数据 (Horizon={self._action_horizon})...")
+            _log.info("Broker refill horizon=%d", self._action_horizon)
         else:
-            # 只有当 step 为 1, 10, 20... 时打印一下，避免刷屏，证明在用缓存
-            if self._cur_step % 10 == 0:
-                print(f"📦 [Broker] 正在使用本地缓存: 第 {self._cur_step} 帧")
-        # ========================================
+            _log.debug("Broker cache hit step=%d", self._cur_step)
         if self._last_results is None:
             self._last_results = self._policy.infer(obs)
             self._cur_step = 0
@@ -100,44 +103,47 @@ class ActionChunkBroker(_base_policy.BasePolicy):
                 return x
             self._last_results = tree.map_structure_with_path(ensure_chunk_dim, self._last_results)
 
-        # 1. 确定 Chunk Size (以 actions 为准)
-        chunk_size = 1
-        actions = self._last_results.get("actions")
-        if actions is not None and isinstance(actions, np.ndarray):
-            chunk_size = actions.shape[0]
-
-        # 2. 智能切片函数
-        def slicer(path, x):
-            if isinstance(x, np.ndarray):
-                # 规则 A: 如果是 'actions'，必须切片 (受 horizon 和 chunk_size 限制)
-                if "actions" in str(path):
-                    # 安全索引：取 min 确保不越界 (虽然逻辑上 cur_step 应该受控)
-                    idx = min(self._cur_step, x.shape[0] - 1)
-                    return x[idx, ...]
-                
-                # 规则 B: 如果其他数组的第一维等于 chunk_size，且维度大于1，大概率也是序列，切它
-                # (例如 logits: (50, 7) -> 切)
-                # (例如 state: (7,) 且 chunk_size=50 -> 不切)
-                if x.shape[0] == chunk_size and x.ndim > 1:
-                    idx = min(self._cur_step, x.shape[0] - 1)
-                    return x[idx, ...]
-                
-                # 规则 C: 其他情况 (如 state, timing)，保持原样，直接透传
-                return x
-                
-            return x
-
-        # 使用 with_path 以便识别 key
-        results = tree.map_structure_with_path(slicer, self._last_results)
+            # --- 切片计划：输出结构在 infer 之间是稳定的，展平一次判定好
+            # 每个叶子要不要按时间维切，热路径不再整树递归 + str(path) 扫描 ---
+            # 1. 确定 Chunk Size (以 actions 为准)
+            chunk_size = 1
+            actions = self._last_results.get("actions")
+            if actions is not None and isinstance(actions, np.ndarray):
+                chunk_size = actions.shape[0]
+
+            flat = []
+            plan = []
+            for path, x in tree.flatten_with_path(self._last_results):
+                # 规则 A: 'actions' 必须切片 (path 是 key 元组，直接查成员，
+                #         不 str() 拼接再扫子串)
+                # 规则 B: 第一维等于 chunk_size 且维度大于 1 的序列也切
+                #         (例如 logits: (50, 7) -> 切; state: (7,) -> 不切)
+                # 规则 C: 其他情况 (如 state, timing)，保持原样透传
+                do_slice = isinstance(x, np.ndarray) and (
+                    "actions" in path
+                    or (x.shape[0] == chunk_size and x.ndim > 1))
+                flat.append(x)
+                plan.append(do_slice)
+
+            # 整个 chunk 一次切成逐帧字典：切片是视图，透传叶子跨帧共享
+            # 引用，额外内存约等于零；消耗多少帧由 horizon/chunk_size 限定
+            num_frames = min(self._action_horizon, chunk_size)
+            self._frames = [
+                tree.unflatten_as(self._last_results, [
+                    x[min(i, x.shape[0] - 1), ...] if do_slice else x
+                    for x, do_slice in zip(flat, plan)
+                ])
+                for i in range(num_frames)
+            ]
+
+        # 2. 热路径：一次下标查找，没有树遍历也没有切片分支
+        results = self._frames[self._cur_step]
         # 只有第 0 帧是新的，需要插值；后续帧都是连续的，不需要插值
         results["is_new_chunk"] = (self._cur_step == 0)
         self._cur_step += 1
 
-        # 3. 决定何时获取下一批数据
-        # 满足任一条件即刷新：
-        # - 达到用户设定的 Horizon (25)
-        # - 消耗完了当前 Chunk 的所有数据 (50)
-        if self._cur_step >= self._action_horizon or self._cur_step >= chunk_size:
+        # 3. 预切的帧用完即刷新 (同时覆盖 Horizon 和 chunk_size 两个上限)
+        if self._cur_step >= len(self._frames):
             self._last_results = None
 
         return results